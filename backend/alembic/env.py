@@ -30,6 +30,12 @@ target_metadata = Base.metadata
 database_url = os.getenv("DATABASE_URL", "sqlite:///./soul_squad.db")
 config.set_main_option("sqlalchemy.url", database_url)
 
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Leave view-backed models (created by their own migration) out of autogenerate"""
+    return not (type_ == "table" and object.info.get("is_view"))
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -52,6 +58,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -75,7 +82,8 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata,
+            include_object=include_object
         )
 
         with context.begin_transaction():
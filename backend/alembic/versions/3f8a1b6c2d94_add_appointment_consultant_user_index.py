@@ -0,0 +1,25 @@
+"""Add appointment consultant/user index
+
+Revision ID: 3f8a1b6c2d94
+Revises: c7d2e9a41f03
+Create Date: 2026-10-15 10:41:07.118524
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f8a1b6c2d94'
+down_revision: Union[str, None] = 'c7d2e9a41f03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_appointments_consultant_user', 'appointments', ['consultant_id', 'user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_appointments_consultant_user', table_name='appointments')
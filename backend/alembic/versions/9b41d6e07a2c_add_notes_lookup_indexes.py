@@ -0,0 +1,33 @@
+"""Add notes lookup indexes
+
+Revision ID: 9b41d6e07a2c
+Revises: 3f8a1b6c2d94
+Create Date: 2026-10-15 14:05:52.730416
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b41d6e07a2c'
+down_revision: Union[str, None] = '3f8a1b6c2d94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_appointments_user_consultant_date', 'appointments',
+                    ['user_id', 'consultant_id', sa.text('appointment_date DESC')], unique=False)
+    # patient_notes is created by init_db rather than a migration, so it may not exist yet
+    if sa.inspect(op.get_bind()).has_table('patient_notes'):
+        op.create_index('ix_patient_notes_patient_consultant_created', 'patient_notes',
+                        ['patient_id', 'consultant_id', sa.text('created_at DESC')], unique=False)
+
+
+def downgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table('patient_notes'):
+        op.drop_index('ix_patient_notes_patient_consultant_created', table_name='patient_notes')
+    op.drop_index('ix_appointments_user_consultant_date', table_name='appointments')
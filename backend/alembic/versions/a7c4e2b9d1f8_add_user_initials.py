@@ -0,0 +1,72 @@
+"""Add user initials
+
+Revision ID: a7c4e2b9d1f8
+Revises: f2b7d9e4a6c1
+Create Date: 2026-10-15 17:03:15.640271
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c4e2b9d1f8'
+down_revision: Union[str, None] = 'f2b7d9e4a6c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OLD_VIEW_QUERY = (
+    "SELECT u.id, u.name, u.email, u.is_active, u.user_type, cp.specialization, cp.hourly_rate "
+    "FROM users u LEFT JOIN consultant_profiles cp ON cp.user_id = u.id "
+    "WHERE u.user_type = 'consultant'"
+)
+NEW_VIEW_QUERY = (
+    "SELECT u.id, u.name, u.initials, u.email, u.is_active, u.user_type, cp.specialization, cp.hourly_rate "
+    "FROM users u LEFT JOIN consultant_profiles cp ON cp.user_id = u.id "
+    "WHERE u.user_type = 'consultant'"
+)
+
+
+def make_initials(name: str) -> str:
+    """Same rule as models.make_initials, frozen here so the migration doesn't import app code"""
+    name_parts = name.split()
+    if len(name_parts) >= 2:
+        return f"{name_parts[0][0]}{name_parts[-1][0]}".upper()
+    elif len(name_parts) == 1:
+        return name_parts[0][:2].upper()
+    else:
+        return "U"
+
+
+def replace_view(query: str) -> None:
+    """Recreate admin_consultants_mv with a new column list"""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP MATERIALIZED VIEW admin_consultants_mv")
+        op.execute(f"CREATE MATERIALIZED VIEW admin_consultants_mv AS {query}")
+        op.execute("CREATE UNIQUE INDEX ix_admin_consultants_mv_id ON admin_consultants_mv (id)")
+    else:
+        op.execute("DROP VIEW admin_consultants_mv")
+        op.execute(f"CREATE VIEW admin_consultants_mv AS {query}")
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('initials', sa.String(length=8), nullable=True))
+    
+    users = sa.table('users', sa.column('id', sa.Integer), sa.column('name', sa.String),
+                     sa.column('initials', sa.String))
+    bind = op.get_bind()
+    rows = bind.execute(sa.select(users.c.id, users.c.name)).all()
+    if rows:
+        bind.execute(
+            users.update().where(users.c.id == sa.bindparam('user_id')),
+            [{'user_id': user_id, 'initials': make_initials(name)} for user_id, name in rows]
+        )
+    
+    replace_view(NEW_VIEW_QUERY)
+
+
+def downgrade() -> None:
+    replace_view(OLD_VIEW_QUERY)
+    op.drop_column('users', 'initials')
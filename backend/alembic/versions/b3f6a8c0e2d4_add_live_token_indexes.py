@@ -0,0 +1,34 @@
+"""Add live OTP and reset token indexes
+
+Revision ID: b3f6a8c0e2d4
+Revises: a7c4e2b9d1f8
+Create Date: 2026-10-15 18:11:52.207493
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3f6a8c0e2d4'
+down_revision: Union[str, None] = 'a7c4e2b9d1f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_otp_live', 'otp_verification', ['phone_number'], unique=False,
+                        postgresql_where=sa.text('is_verified = false'),
+                        postgresql_concurrently=True)
+        op.create_index('ix_reset_live', 'password_reset_tokens', ['token'], unique=False,
+                        postgresql_where=sa.text('used = false'),
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_reset_live', table_name='password_reset_tokens', postgresql_concurrently=True)
+        op.drop_index('ix_otp_live', table_name='otp_verification', postgresql_concurrently=True)
@@ -0,0 +1,32 @@
+"""Add user/timestamp indexes
+
+Revision ID: c7d2e9a41f03
+Revises: be4a38afdb48
+Create Date: 2026-10-15 10:12:31.402187
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d2e9a41f03'
+down_revision: Union[str, None] = 'be4a38afdb48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_vitals_user_ts', 'vitals_records', ['user_id', sa.text('timestamp DESC')], unique=False)
+    op.create_index('ix_mood_user_ts', 'mood_entries', ['user_id', sa.text('timestamp DESC')], unique=False)
+    op.create_index('ix_rx_user_created', 'prescriptions', ['user_id', sa.text('created_at DESC')], unique=False)
+    op.create_index('ix_call_user_actual', 'call_sessions', ['user_id', sa.text('actual_start DESC')], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_call_user_actual', table_name='call_sessions')
+    op.drop_index('ix_rx_user_created', table_name='prescriptions')
+    op.drop_index('ix_mood_user_ts', table_name='mood_entries')
+    op.drop_index('ix_vitals_user_ts', table_name='vitals_records')
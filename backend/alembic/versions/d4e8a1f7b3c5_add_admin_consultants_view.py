@@ -0,0 +1,39 @@
+"""Add admin consultants view
+
+Revision ID: d4e8a1f7b3c5
+Revises: 9b41d6e07a2c
+Create Date: 2026-10-15 15:12:08.114920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e8a1f7b3c5'
+down_revision: Union[str, None] = '9b41d6e07a2c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+VIEW_QUERY = (
+    "SELECT u.id, u.name, u.email, u.is_active, u.user_type, cp.specialization, cp.hourly_rate "
+    "FROM users u LEFT JOIN consultant_profiles cp ON cp.user_id = u.id "
+    "WHERE u.user_type = 'consultant'"
+)
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(f"CREATE MATERIALIZED VIEW admin_consultants_mv AS {VIEW_QUERY}")
+        # Required for REFRESH MATERIALIZED VIEW CONCURRENTLY
+        op.execute("CREATE UNIQUE INDEX ix_admin_consultants_mv_id ON admin_consultants_mv (id)")
+    else:
+        op.execute(f"CREATE VIEW admin_consultants_mv AS {VIEW_QUERY}")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP MATERIALIZED VIEW admin_consultants_mv")
+    else:
+        op.execute("DROP VIEW admin_consultants_mv")
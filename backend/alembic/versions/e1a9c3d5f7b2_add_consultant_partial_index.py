@@ -0,0 +1,33 @@
+"""Add consultant partial index on users
+
+Revision ID: e1a9c3d5f7b2
+Revises: d4e8a1f7b3c5
+Create Date: 2026-10-15 15:48:31.502877
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1a9c3d5f7b2'
+down_revision: Union[str, None] = 'd4e8a1f7b3c5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY avoids locking users against writes while the index builds,
+    # but cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index('ix_users_consultant_partial', 'users', ['user_type'], unique=False,
+                        postgresql_where=sa.text("user_type = 'consultant'"),
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_users_consultant_partial', table_name='users',
+                      postgresql_concurrently=True)
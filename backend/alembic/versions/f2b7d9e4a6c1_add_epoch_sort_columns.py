@@ -0,0 +1,41 @@
+"""Add epoch sort columns
+
+Revision ID: f2b7d9e4a6c1
+Revises: e1a9c3d5f7b2
+Create Date: 2026-10-15 16:27:44.918306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b7d9e4a6c1'
+down_revision: Union[str, None] = 'e1a9c3d5f7b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def epoch_column(name: str, source: str, timezone: bool) -> sa.Column:
+    """Generated BIGINT column holding source as seconds since the Unix epoch"""
+    if op.get_bind().dialect.name == 'postgresql':
+        if timezone:
+            source = f"({source} AT TIME ZONE 'UTC')"
+        return sa.Column(name, sa.BigInteger(), sa.Computed(f"CAST(EXTRACT(EPOCH FROM {source}) AS BIGINT)", persisted=True))
+    # SQLite can only add VIRTUAL generated columns to an existing table
+    return sa.Column(name, sa.BigInteger(), sa.Computed(f"CAST(strftime('%s', {source}) AS INTEGER)", persisted=False))
+
+
+def upgrade() -> None:
+    op.add_column('appointments', epoch_column('appointment_date_epoch', 'appointment_date', timezone=False))
+    # patient_notes is created by init_db rather than a migration, so it may not exist yet
+    if sa.inspect(op.get_bind()).has_table('patient_notes'):
+        op.add_column('patient_notes', epoch_column('created_at_epoch', 'created_at', timezone=True))
+
+
+def downgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table('patient_notes'):
+        op.drop_column('patient_notes', 'created_at_epoch')
+    op.drop_column('appointments', 'appointment_date_epoch')
@@ -1,8 +1,16 @@
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import AuditLog
+from database import AsyncSessionLocal, SessionLocal
 from fastapi import Request
+import asyncio
 import datetime
 
+# Batched audit writes: rows queued by enqueue_event are inserted together
+AUDIT_FLUSH_INTERVAL_SECONDS = 0.1
+AUDIT_BATCH_SIZE = 500
+
 class AuditLogger:
     """
     Helper class to create audit logs for HIPAA compliance.
@@ -36,29 +44,161 @@ class AuditLogger:
             request: FastAPI request object (to auto-extract IP if not provided)
         """
         try:
-            # Extract IP from request if not explicitly provided
-            if not ip_address and request:
-                ip_address = request.client.host
-            
-            # Create log entry
-            log_entry = AuditLog(
-                user_id=user_id,
-                event_type=event_type,
-                resource_type=resource_type,
-                resource_id=resource_id,
-                details=details,
-                ip_address=ip_address,
-                status=status,
-                timestamp=datetime.datetime.utcnow()
+            log_entry = AuditLogger._build_entry(
+                event_type, user_id, resource_type, resource_id, details, status, ip_address, request
             )
-            
             db.add(log_entry)
             db.commit()
             
             # Also print to console for development visibility (but structured logging is better for prod)
-            print(f"[AUDIT] {event_type} | User: {user_id} | Status: {status} | IP: {ip_address}")
+            print(f"[AUDIT] {event_type} | User: {user_id} | Status: {status} | IP: {log_entry.ip_address}")
             
         except Exception as e:
             # Fallback logging if DB write fails - CRITICAL for audit systems
             print(f"CRITICAL: Failed to write audit log! {str(e)}")
             # In a real production system, this should alert the admin immediately
+
+    @staticmethod
+    async def alog_event(
+        db: AsyncSession, 
+        event_type: str, 
+        user_id: int = None, 
+        resource_type: str = None, 
+        resource_id: str = None, 
+        details: str = None,
+        status: str = "success", 
+        ip_address: str = None,
+        request: Request = None
+    ):
+        """Same as log_event, for handlers running on an AsyncSession"""
+        try:
+            log_entry = AuditLogger._build_entry(
+                event_type, user_id, resource_type, resource_id, details, status, ip_address, request
+            )
+            db.add(log_entry)
+            await db.commit()
+            
+            print(f"[AUDIT] {event_type} | User: {user_id} | Status: {status} | IP: {log_entry.ip_address}")
+            
+        except Exception as e:
+            print(f"CRITICAL: Failed to write audit log! {str(e)}")
+
+    @staticmethod
+    def _build_entry(event_type, user_id, resource_type, resource_id, details, status, ip_address, request) -> AuditLog:
+        """Create the AuditLog row, pulling the client IP from the request if needed"""
+        return AuditLog(**AuditLogger._build_row(
+            event_type, user_id, resource_type, resource_id, details, status, ip_address, request
+        ))
+
+    @staticmethod
+    def _build_row(event_type, user_id, resource_type, resource_id, details, status, ip_address, request) -> dict:
+        """Column values for an audit log row"""
+        # Extract IP from request if not explicitly provided
+        if not ip_address and request and request.client:
+            ip_address = request.client.host
+        
+        return {
+            "user_id": user_id,
+            "event_type": event_type,
+            "resource_type": resource_type,
+            "resource_id": resource_id,
+            "details": details,
+            "ip_address": ip_address,
+            "status": status,
+            "timestamp": datetime.datetime.utcnow()
+        }
+
+    # ------------------------------------------------------------------
+    # Batched writes
+    # ------------------------------------------------------------------
+
+    _queue: "asyncio.Queue[dict]" = None
+    _worker: "asyncio.Task" = None
+
+    @staticmethod
+    def enqueue_event(
+        event_type: str, 
+        user_id: int = None, 
+        resource_type: str = None, 
+        resource_id: str = None, 
+        details: str = None,
+        status: str = "success", 
+        ip_address: str = None,
+        request: Request = None
+    ):
+        """
+        Queue an audit log entry to be written with the next batch.
+        
+        Must be called from the event loop (async handlers). Use log_event /
+        alog_event instead when the entry has to be durable before responding.
+        """
+        row = AuditLogger._build_row(
+            event_type, user_id, resource_type, resource_id, details, status, ip_address, request
+        )
+        AuditLogger.start_worker()
+        AuditLogger._queue.put_nowait(row)
+        print(f"[AUDIT] {event_type} | User: {user_id} | Status: {status} | IP: {row['ip_address']}")
+
+    @staticmethod
+    def start_worker():
+        """Start the background task that flushes queued audit rows"""
+        if AuditLogger._queue is None:
+            AuditLogger._queue = asyncio.Queue()
+        if AuditLogger._worker is None or AuditLogger._worker.done():
+            AuditLogger._worker = asyncio.get_running_loop().create_task(AuditLogger._drain_queue())
+
+    @staticmethod
+    async def stop_worker():
+        """Stop the background task and write anything still queued"""
+        if AuditLogger._worker is not None:
+            AuditLogger._worker.cancel()
+            try:
+                await AuditLogger._worker
+            except asyncio.CancelledError:
+                pass
+            AuditLogger._worker = None
+        if AuditLogger._queue is not None:
+            rows = []
+            while not AuditLogger._queue.empty():
+                rows.append(AuditLogger._queue.get_nowait())
+            await AuditLogger._write_batch(rows)
+
+    @staticmethod
+    async def _drain_queue():
+        """Collect queued rows for up to AUDIT_FLUSH_INTERVAL_SECONDS, then insert them together"""
+        loop = asyncio.get_running_loop()
+        while True:
+            rows = [await AuditLogger._queue.get()]
+            deadline = loop.time() + AUDIT_FLUSH_INTERVAL_SECONDS
+            try:
+                while len(rows) < AUDIT_BATCH_SIZE:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        rows.append(await asyncio.wait_for(AuditLogger._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # Shutting down: don't drop rows already taken off the queue
+                await AuditLogger._write_batch(rows)
+                raise
+            await AuditLogger._write_batch(rows)
+
+    @staticmethod
+    async def _write_batch(rows: list):
+        """Insert a batch of audit rows in one statement and commit"""
+        if not rows:
+            return
+        try:
+            if AsyncSessionLocal is not None:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(insert(AuditLog), rows)
+                    await db.commit()
+            else:
+                with SessionLocal() as db:
+                    db.execute(insert(AuditLog), rows)
+                    db.commit()
+        except Exception as e:
+            # Fallback logging if DB write fails - CRITICAL for audit systems
+            print(f"CRITICAL: Failed to write {len(rows)} audit log entries! {str(e)}")
@@ -0,0 +1,179 @@
+"""
+Shared Cache
+Short-lived caching for hot read paths (patient data, listings, lookups)
+Uses Redis when REDIS_URL is configured, otherwise an in-process TTL cache
+"""
+import os
+import json
+import time
+import threading
+from typing import Any, Awaitable, Callable, Optional, Union
+
+try:
+    import redis
+    import redis.asyncio as redis_asyncio
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_MAX_CONNECTIONS = 50
+
+
+class BaseCache:
+    """JSON helpers shared by the cache backends"""
+
+    def get_json(self, key: str) -> Any:
+        raw = self.get(key)
+        return None if raw is None else json.loads(raw)
+
+    def set_json(self, key: str, value: Any, ttl: int):
+        self.set(key, json.dumps(value), ttl)
+
+    async def aget_json(self, key: str) -> Any:
+        raw = await self.aget(key)
+        return None if raw is None else json.loads(raw)
+
+    async def aset_json(self, key: str, value: Any, ttl: int):
+        await self.aset(key, json.dumps(value), ttl)
+
+    def memoize(self, key: str, loader: Callable[[], Any], ttl: int) -> Any:
+        """Return the cached value for key, or call loader() and cache its JSON result"""
+        value = self.get_json(key)
+        if value is None:
+            value = loader()
+            self.set_json(key, value, ttl)
+        return value
+
+    async def amemoize(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: int) -> Any:
+        """Async memoize: await loader() on a miss"""
+        value = await self.aget_json(key)
+        if value is None:
+            value = await loader()
+            await self.aset_json(key, value, ttl)
+        return value
+
+
+class MemoryCache(BaseCache):
+    """In-process TTL cache used when Redis is not configured (per worker)"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._data = {}  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Union[bytes, str]]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: str, value: Union[bytes, str], ttl: int):
+        with self._lock:
+            if len(self._data) >= self.max_entries:
+                self._evict()
+            self._data[key] = (time.monotonic() + ttl, value)
+
+    def delete(self, *keys: str):
+        for key in keys:
+            self._data.pop(key, None)
+
+    def _evict(self):
+        """Drop expired entries, then the oldest ones if still over capacity"""
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in self._data.items() if expires_at < now]:
+            del self._data[key]
+        overflow = len(self._data) - self.max_entries + 1
+        for key in list(self._data)[:max(overflow, 0)]:
+            del self._data[key]
+
+    # Async interface, so async handlers can use either backend the same way
+    async def aget(self, key: str) -> Optional[Union[bytes, str]]:
+        return self.get(key)
+
+    async def aset(self, key: str, value: Union[bytes, str], ttl: int):
+        self.set(key, value, ttl)
+
+    async def adelete(self, *keys: str):
+        self.delete(*keys)
+
+
+class NullCache(BaseCache):
+    """Cache that stores nothing, for entries that must not be cached per worker"""
+
+    def get(self, key: str) -> None:
+        return None
+
+    def set(self, key: str, value: Union[bytes, str], ttl: int):
+        pass
+
+    def delete(self, *keys: str):
+        pass
+
+    async def aget(self, key: str) -> None:
+        return None
+
+    async def aset(self, key: str, value: Union[bytes, str], ttl: int):
+        pass
+
+    async def adelete(self, *keys: str):
+        pass
+
+
+class RedisCache(BaseCache):
+    """Redis-backed cache shared by all workers"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.client = redis.Redis(
+            connection_pool=redis.ConnectionPool.from_url(url, max_connections=REDIS_MAX_CONNECTIONS)
+        )
+        # The asyncio client binds to the running event loop, so create it on first use
+        self._async_client = None
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            self._async_client = redis_asyncio.Redis.from_url(self.url, max_connections=REDIS_MAX_CONNECTIONS)
+        return self._async_client
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: Union[bytes, str], ttl: int):
+        self.client.set(key, value, ex=ttl)
+
+    def delete(self, *keys: str):
+        if keys:
+            self.client.delete(*keys)
+
+    async def aget(self, key: str) -> Optional[bytes]:
+        return await self.async_client.get(key)
+
+    async def aset(self, key: str, value: Union[bytes, str], ttl: int):
+        await self.async_client.set(key, value, ex=ttl)
+
+    async def adelete(self, *keys: str):
+        if keys:
+            await self.async_client.delete(*keys)
+
+
+# Global instance
+if REDIS_URL and REDIS_AVAILABLE:
+    cache = RedisCache(REDIS_URL)
+    print("[Cache] Using Redis")
+else:
+    if REDIS_URL:
+        print("[Cache] redis package not installed. Run: pip install redis")
+    cache = MemoryCache()
+    print("[Cache] Using in-process memory cache")
+
+# For entries whose invalidation must reach every worker (roles, permissions,
+# pages that must show a write at once). A per-process cache would only be
+# invalidated in the worker that handled the write, so without Redis these
+# are not cached at all
+shared_cache = cache if isinstance(cache, RedisCache) else NullCache()
@@ -0,0 +1,156 @@
+"""
+Conversation Memory
+Per-user context for the AI assistant: a short sliding window of recent
+messages plus long-term facts about the user (name, preferences)
+Uses the shared Redis connection when configured, otherwise nothing is kept
+"""
+import json
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from cache import cache, RedisCache
+
+# Messages kept verbatim for context (3 exchanges)
+WINDOW_SIZE = 6
+# Idle conversations are forgotten after 30 days
+MEMORY_TTL = 30 * 24 * 3600
+# History sent with each message is capped by size rather than message count
+HISTORY_TOKEN_BUDGET = 3000
+
+FactExtractor = Callable[[str], Awaitable[Dict[str, str]]]
+
+FACT_EXTRACTION_PROMPT = """Extract durable facts the user states about themselves in the message below,
+such as their name, preferred name, pronouns, goals or preferences.
+Reply with a JSON object mapping short snake_case keys to short string values,
+or {} if there are none. Ignore feelings or events that only describe today."""
+
+
+def window_key(user_id: int) -> str:
+    return f"chat:{user_id}:window"
+
+
+def facts_key(user_id: int) -> str:
+    return f"chat:{user_id}:facts"
+
+
+def facts_message(facts: Dict[str, str]) -> Optional[Dict]:
+    """System message carrying the long-term facts, or None when there are none"""
+    if not facts:
+        return None
+    lines = "\n".join(f"- {name}: {value}" for name, value in sorted(facts.items()))
+    return {"role": "system", "content": f"Known facts about the user:\n{lines}"}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token) for models without a local tokenizer"""
+    return len(text) // 4 + 1
+
+
+def fit_to_budget(conversation_history: List[Dict], max_tokens: int = HISTORY_TOKEN_BUDGET,
+                  count_tokens: Callable[[str], int] = estimate_tokens) -> List[Dict]:
+    """The most recent messages whose combined size fits in max_tokens, oldest first"""
+    kept = []
+    used = 0
+    for msg in reversed(conversation_history or []):
+        used += count_tokens(msg.get("content", ""))
+        if used > max_tokens:
+            break
+        kept.append(msg)
+    kept.reverse()
+    return kept
+
+
+def parse_facts(text: str) -> Dict[str, str]:
+    """Parse an extractor reply into {fact: value}, ignoring anything that isn't a flat JSON object"""
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {str(name): str(value) for name, value in data.items()
+            if isinstance(value, (str, int, float)) and str(value).strip()}
+
+
+class BaseConversationMemory:
+    """Post-turn hook shared by the memory backends"""
+
+    async def aremember_turn(self, user_id: int, message: str, response: str,
+                             extract_facts: Optional[FactExtractor] = None):
+        """Record a finished exchange and, given an extractor, store any durable facts it reveals"""
+        await self.aadd_turn(user_id, message, response)
+        if extract_facts is not None:
+            facts = await extract_facts(message)
+            if facts:
+                await self.aset_facts(user_id, facts)
+
+
+class NullConversationMemory(BaseConversationMemory):
+    """
+    Used when Redis is not configured: stores nothing, so the window is rebuilt from
+    the database on every message. A per-worker copy would miss turns served by other
+    workers and survive a reset handled by another worker
+    """
+
+    async def aget_window(self, user_id: int) -> List[Dict]:
+        return []
+
+    async def aremember_turn(self, user_id: int, message: str, response: str,
+                             extract_facts: Optional[FactExtractor] = None):
+        # Nowhere to keep facts, so skip the extraction call
+        pass
+
+    async def aadd_turn(self, user_id: int, message: str, response: str):
+        pass
+
+    async def aget_facts(self, user_id: int) -> Dict[str, str]:
+        return {}
+
+    async def aset_facts(self, user_id: int, facts: Dict[str, str]):
+        pass
+
+    async def aclear(self, user_id: int):
+        pass
+
+
+class RedisConversationMemory(BaseConversationMemory):
+    """Redis-backed memory shared by all workers (newest message first in the window list)"""
+
+    def __init__(self, redis_cache: RedisCache):
+        self.redis_cache = redis_cache
+
+    async def aget_window(self, user_id: int) -> List[Dict]:
+        raw = await self.redis_cache.async_client.lrange(window_key(user_id), 0, -1)
+        return [json.loads(item) for item in reversed(raw)]
+
+    async def aadd_turn(self, user_id: int, message: str, response: str):
+        key = window_key(user_id)
+        async with self.redis_cache.async_client.pipeline(transaction=False) as pipe:
+            pipe.lpush(
+                key,
+                json.dumps({"content": message, "is_user": True}),
+                json.dumps({"content": response, "is_user": False}),
+            )
+            pipe.ltrim(key, 0, WINDOW_SIZE - 1)
+            pipe.expire(key, MEMORY_TTL)
+            await pipe.execute()
+
+    async def aget_facts(self, user_id: int) -> Dict[str, str]:
+        raw = await self.redis_cache.async_client.hgetall(facts_key(user_id))
+        return {name.decode(): value.decode() for name, value in raw.items()}
+
+    async def aset_facts(self, user_id: int, facts: Dict[str, str]):
+        key = facts_key(user_id)
+        async with self.redis_cache.async_client.pipeline(transaction=False) as pipe:
+            pipe.hset(key, mapping=facts)
+            pipe.expire(key, MEMORY_TTL)
+            await pipe.execute()
+
+    async def aclear(self, user_id: int):
+        await self.redis_cache.async_client.delete(window_key(user_id), facts_key(user_id))
+
+
+# Global instance
+if isinstance(cache, RedisCache):
+    conversation_memory = RedisConversationMemory(cache)
+else:
+    conversation_memory = NullConversationMemory()
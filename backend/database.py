@@ -1,6 +1,10 @@
 from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool, NullPool
+from sqlalchemy.engine import URL, make_url
 from sqlalchemy.orm import sessionmaker, Session
-from models import Base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy import text
+from models import Base, ADMIN_CONSULTANTS_VIEW_QUERY
 import os
 
 # Database configuration
@@ -21,6 +25,16 @@ else:
     # Fallback to SQLite (Local Development)
     DATABASE_URL = "sqlite:///./soul_squad.db"
 
+# Connection pool sizing. Connection setup (TLS + auth) costs far more than
+# these short queries, so keep enough warm connections for concurrent requests.
+# Tunable per deployment without a code change.
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "25"))
+POOL_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "25"))
+POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+POOL_TIMEOUT_SECONDS = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Behind PgBouncer (transaction pooling) the bouncer owns the pool, so don't keep one here
+USE_PGBOUNCER = os.getenv("DB_USE_PGBOUNCER", "false").lower() == "true"
+
 # Connection arguments
 connect_args = {}
 
@@ -31,15 +45,27 @@ else:
     # PostgreSQL configuration
     pass
 
+def get_pool_options(poolclass=QueuePool) -> dict:
+    """Engine keyword arguments for the connection pool"""
+    if USE_PGBOUNCER:
+        return {"poolclass": NullPool}
+    return {
+        "poolclass": poolclass,
+        "pool_pre_ping": True,
+        "pool_size": POOL_SIZE,
+        "max_overflow": POOL_MAX_OVERFLOW,
+        "pool_recycle": POOL_RECYCLE_SECONDS,
+        "pool_timeout": POOL_TIMEOUT_SECONDS
+    }
+
+
 # Create engine
 try:
     engine = create_engine(
         DATABASE_URL,
         connect_args=connect_args,
         echo=False,
-        pool_pre_ping=True,
-        pool_size=5,
-        max_overflow=10
+        **get_pool_options()
     )
     # Test connection
     with engine.connect() as connection:
@@ -60,9 +86,123 @@ except Exception as e:
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+def get_async_database_url(url: str) -> URL:
+    """Map the configured database URL onto its asyncio driver (asyncpg / aiosqlite)"""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    
+    # pg8000 takes the Cloud SQL socket as unix_sock; asyncpg expects it as host
+    query = dict(url.query)
+    if "unix_sock" in query:
+        query["host"] = query.pop("unix_sock")
+    return url.set(drivername="postgresql+asyncpg", query=query)
+
+
+# Create async engine for handlers that await their queries instead of
+# occupying a threadpool worker. Mirrors the sync engine's configuration.
+try:
+    ASYNC_DATABASE_URL = get_async_database_url(DATABASE_URL)
+    if ASYNC_DATABASE_URL.get_backend_name() == "sqlite":
+        async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False)
+    else:
+        async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            echo=False,
+            **get_pool_options(AsyncAdaptedQueuePool)
+        )
+    AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+except Exception as e:
+    print(f"Async database engine unavailable: {e}")
+    async_engine = None
+    AsyncSessionLocal = None
+
+
+def warm_pool():
+    """Open pool_size connections up front so early requests skip connection setup"""
+    size = engine.pool.size() if hasattr(engine.pool, "size") else 0
+    connections = []
+    try:
+        # Hold every connection open at once, otherwise the pool hands back the same one
+        for _ in range(size):
+            connections.append(engine.connect())
+    except Exception as e:
+        print(f"Connection pool warm-up stopped early: {e}")
+    finally:
+        for connection in connections:
+            connection.close()
+    return len(connections)
+
+
+async def warm_async_pool():
+    """Async counterpart of warm_pool() for the async engine"""
+    if async_engine is None or not hasattr(async_engine.pool, "size"):
+        return 0
+    connections = []
+    try:
+        for _ in range(async_engine.pool.size()):
+            connections.append(await async_engine.connect())
+    except Exception as e:
+        print(f"Async connection pool warm-up stopped early: {e}")
+    finally:
+        for connection in connections:
+            await connection.close()
+    return len(connections)
+
+
+def _pool_stats(pool) -> dict:
+    """Summarise a connection pool's usage for health checks"""
+    if not hasattr(pool, "checkedout"):
+        return {"pool": type(pool).__name__}
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow()
+    }
+
+
+def get_pool_stats() -> dict:
+    """Connection pool statistics for the sync and async engines"""
+    stats = {"sync": _pool_stats(engine.pool)}
+    if async_engine is not None:
+        stats["async"] = _pool_stats(async_engine.pool)
+    return stats
+
+
+def create_views(connection):
+    """Create the read-only views mapped in models.py (materialized on PostgreSQL)"""
+    if connection.dialect.name == "postgresql":
+        connection.execute(text(f"CREATE MATERIALIZED VIEW IF NOT EXISTS admin_consultants_mv AS {ADMIN_CONSULTANTS_VIEW_QUERY}"))
+        # REFRESH ... CONCURRENTLY needs a unique index
+        connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_admin_consultants_mv_id ON admin_consultants_mv (id)"))
+    else:
+        # Plain views hold no data, so always recreate them with the current definition
+        connection.execute(text("DROP VIEW IF EXISTS admin_consultants_mv"))
+        connection.execute(text(f"CREATE VIEW admin_consultants_mv AS {ADMIN_CONSULTANTS_VIEW_QUERY}"))
+
+
+def refresh_admin_consultants_view(db: Session):
+    """Refresh the admin consultant listing after writes to users / consultant_profiles"""
+    if db.bind.dialect.name == "postgresql":
+        db.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY admin_consultants_mv"))
+        db.commit()
+
+
+async def arefresh_admin_consultants_view(db: AsyncSession):
+    """Async counterpart of refresh_admin_consultants_view()"""
+    if db.bind.dialect.name == "postgresql":
+        await db.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY admin_consultants_mv"))
+        await db.commit()
+
+
 def init_db():
     """Initialize the database by creating all tables"""
-    Base.metadata.create_all(bind=engine)
+    tables = [table for table in Base.metadata.sorted_tables if not table.info.get("is_view")]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    with engine.begin() as connection:
+        create_views(connection)
     print("Database initialized successfully!")
 
 
@@ -78,6 +218,33 @@ def get_db() -> Session:
         db.close()
 
 
+async def get_async_db() -> AsyncSession:
+    """
+    Dependency function to get an async database session.
+    Use with FastAPI Depends() in async def handlers.
+    """
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database driver is not installed (asyncpg / aiosqlite)")
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception:
+            # Handlers don't roll back themselves; undo anything left pending
+            await db.rollback()
+            raise
+
+
+async def fetch_all(statement) -> list:
+    """
+    Run a read-only statement on its own pooled async session and return all rows.
+    Lets independent queries run concurrently with asyncio.gather().
+    """
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database driver is not installed (asyncpg / aiosqlite)")
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(statement)).all()
+
+
 def get_db_session() -> Session:
     """
     Get a database session for manual use.
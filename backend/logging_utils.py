@@ -0,0 +1,46 @@
+"""
+Logging Utilities
+Queue-backed loggers: request handlers only enqueue log records, while
+formatting and I/O happen on a background listener thread
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+
+
+def get_queue_logger(name: str, *handlers: logging.Handler, level: int = logging.INFO) -> logging.Logger:
+    """
+    Get a logger whose records are written by `handlers` on a background thread
+
+    Args:
+        name: Logger name
+        handlers: Handlers that do the actual output (defaults to stderr)
+        level: Minimum level to log
+
+    Returns:
+        Configured logger (calling again with the same name reuses it)
+    """
+    logger = logging.getLogger(name)
+    if getattr(logger, "queue_listener", None) is not None:
+        return logger
+
+    if not handlers:
+        handlers = (logging.StreamHandler(),)
+    for handler in handlers:
+        if handler.formatter is None:
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Flush anything still queued when the process exits
+    atexit.register(listener.stop)
+
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(level)
+    logger.propagate = False
+    logger.queue_listener = listener
+    return logger
@@ -1,26 +1,43 @@
-from fastapi import FastAPI, Request, Depends, HTTPException
+from fastapi import FastAPI, Request, Depends, HTTPException, Query
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, Response, StreamingResponse, ORJSONResponse
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
-from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
+from sqlalchemy import select, insert, delete, union_all, literal, desc, tuple_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload, load_only, undefer, raiseload
 import os
+import asyncio
 import secrets
+import anyio
+import orjson
 import uuid
+import time
 from datetime import datetime, timedelta
+from typing import NamedTuple, Optional, Tuple
+from functools import lru_cache
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 # Import database and models
-from database import init_db, get_db, get_db_session
-from models import User, PasswordResetToken, VitalsRecord, ConsultantProfile, ConsultantSchedule, Appointment, Message, AIChatHistory, CallSession, MoodEntry, Prescription, PrescriptionItem, PatientNote, OTPVerification, UserProfile
+from database import init_db, get_db, get_async_db, get_db_session, warm_pool, warm_async_pool, get_pool_stats, refresh_admin_consultants_view, arefresh_admin_consultants_view, fetch_all
+from models import User, PasswordResetToken, VitalsRecord, ConsultantProfile, ConsultantSchedule, Appointment, Message, AIChatHistory, CallSession, CallTranscription, MoodEntry, Prescription, PrescriptionItem, PatientNote, OTPVerification, UserProfile, AdminConsultantView, make_initials
 from email_utils import send_password_reset_email, send_welcome_email
+from chat_memory import conversation_memory, WINDOW_SIZE
 from vertex_chat import vertex_chat  # Using Vertex AI (Gemini) with GCP credits
 from audit_logging import AuditLogger
 from firebase_otp import FallbackOTP
+from cache import cache, shared_cache
+from logging_utils import get_queue_logger
+
+logger = get_queue_logger(__name__)
 
 # Import Socket.IO for WebRTC signaling
 from call_signaling import sio, get_socket_app
@@ -29,7 +46,8 @@ from call_signaling import sio, get_socket_app
 app = FastAPI(
     title="SolaceSquad - Wellbeing Platform",
     description="Professional wellbeing consultants platform with voice calling",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Add cache control middleware to prevent browser caching
@@ -47,12 +65,72 @@ class NoCacheMiddleware(BaseHTTPMiddleware):
 
 app.add_middleware(NoCacheMiddleware)
 
+# Worker threads available to sync route handlers
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "100"))
+
 # Initialize database on startup
+# Expired OTPs and reset tokens are purged periodically, so those tables and
+# their indexes only hold rows that can still be used
+TOKEN_PURGE_INTERVAL_SECONDS = 3600
+EXPIRED_TOKEN_RETENTION = timedelta(days=1)
+
+def purge_expired_tokens() -> int:
+    """Delete OTPs and password reset tokens that expired more than a day ago"""
+    cutoff = datetime.utcnow() - EXPIRED_TOKEN_RETENTION
+    db = get_db_session()
+    try:
+        deleted = db.query(OTPVerification).filter(
+            OTPVerification.expires_at < cutoff
+        ).delete(synchronize_session=False)
+        deleted += db.query(PasswordResetToken).filter(
+            PasswordResetToken.expires_at < cutoff
+        ).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+async def purge_expired_tokens_periodically():
+    """Background task running purge_expired_tokens() every TOKEN_PURGE_INTERVAL_SECONDS"""
+    while True:
+        try:
+            await run_in_threadpool(purge_expired_tokens)
+        except Exception:
+            logger.exception("Error purging expired tokens")
+        await asyncio.sleep(TOKEN_PURGE_INTERVAL_SECONDS)
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on application startup"""
     init_db()
     print("[OK] Database initialized")
+    warmed = await run_in_threadpool(warm_pool)
+    warmed_async = await warm_async_pool()
+    print(f"[OK] Connection pools warmed ({warmed} sync, {warmed_async} async)")
+    # Sync (def) handlers run in anyio's worker threads; size the pool for
+    # concurrent DB-bound requests rather than the default 40 tokens
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    # Admin audit entries are queued and written in batches
+    AuditLogger.start_worker()
+    app.state.token_purge_task = asyncio.get_running_loop().create_task(purge_expired_tokens_periodically())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush queued audit log entries and stop background tasks and workers before exiting"""
+    await AuditLogger.stop_worker()
+    token_purge_task = getattr(app.state, "token_purge_task", None)
+    if token_purge_task is not None:
+        token_purge_task.cancel()
+    # Started lazily by the first prescription download
+    from pdf_generator import shutdown_pdf_pool
+    await run_in_threadpool(shutdown_pdf_pool)
+
+@app.exception_handler(Exception)
+async def unhandled_exception_handler(request: Request, exc: Exception):
+    """Log unexpected errors once and answer with a generic error instead of the exception text"""
+    logger.error("Unhandled error on %s %s", request.method, request.url.path, exc_info=exc)
+    return ORJSONResponse({"success": False, "error": "internal"}, status_code=500)
 
 # Add session middleware for user data storage
 # In production, use a secure secret key from environment variables
@@ -68,6 +146,14 @@ app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "static")), na
 # Setup Jinja2 templates
 templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
 
+# In development, list queries raise on any relationship that was not eagerly
+# loaded, so N+1 regressions fail loudly instead of silently adding queries
+STRICT_LOADING = os.getenv(
+    "STRICT_LOADING",
+    "true" if os.getenv("ENVIRONMENT", "development") == "development" else "false"
+).lower() == "true"
+STRICT_LOADING_OPTIONS = (raiseload("*"),) if STRICT_LOADING else ()
+
 # PWA Routes
 @app.get("/sw.js", include_in_schema=False)
 async def get_service_worker():
@@ -81,29 +167,38 @@ async def get_manifest():
 # HELPER FUNCTIONS
 # ============================================================================
 
+MONTH_NAMES = ('', 'January', 'February', 'March', 'April', 'May', 'June',
+               'July', 'August', 'September', 'October', 'November', 'December')
+MONTH_ABBRS = ('', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+               'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+def format_long_date(dt: datetime) -> str:
+    """Format as "January 05, 2026" without going through strftime"""
+    return f"{MONTH_NAMES[dt.month]} {dt.day:02d}, {dt.year}"
+
+def format_short_datetime(dt: datetime) -> str:
+    """Format as "Jan 05, 14:30" without going through strftime"""
+    return f"{MONTH_ABBRS[dt.month]} {dt.day:02d}, {dt.hour:02d}:{dt.minute:02d}"
+
+@lru_cache(maxsize=4096)
 def get_initials(name: str) -> str:
-    """Generate initials from a name"""
-    name_parts = name.split()
-    if len(name_parts) >= 2:
-        return f"{name_parts[0][0]}{name_parts[-1][0]}".upper()
-    elif len(name_parts) == 1:
-        return name_parts[0][:2].upper()
-    else:
-        return "U"
+    """Generate initials from a name (for names that don't come with a stored User.initials)"""
+    return make_initials(name)
 
-def get_nav_items(user_type: str) -> list:
-    """Get navigation items based on user type"""
+@lru_cache(maxsize=8)
+def get_nav_items(user_type: str) -> tuple:
+    """Get navigation items based on user type (cached and shared, so treat as read-only)"""
     if user_type == "consultant":
-        return [
+        return (
             {'icon': 'layout-dashboard', 'label': 'Dashboard', 'href': '/consultant', 'key': 'dashboard'},
             {'icon': 'users', 'label': 'Clients', 'href': '/consultant/clients', 'key': 'clients'},
             {'icon': 'calendar', 'label': 'Schedule', 'href': '/consultant/schedule', 'key': 'schedule'},
             {'icon': 'message-circle', 'label': 'Messages', 'href': '/consultant/messages', 'key': 'messages'},
             {'icon': 'file-text', 'label': 'Wellness Summary Report', 'href': '/consultant/prescriptions', 'key': 'prescriptions'},
             {'icon': 'user', 'label': 'Profile', 'href': '/consultant/profile', 'key': 'profile'}
-        ]
+        )
     else:  # user
-        return [
+        return (
             {'icon': 'layout-dashboard', 'label': 'Dashboard', 'href': '/app', 'key': 'dashboard'},
             {'icon': 'activity', 'label': 'Vitals & Scan', 'href': '/app/vitals', 'key': 'vitals'},
             {'icon': 'message-circle', 'label': 'Messages', 'href': '/app/messages', 'key': 'messages'},
@@ -115,7 +210,49 @@ def get_nav_items(user_type: str) -> list:
             {'icon': 'mic', 'label': 'Call Recordings', 'href': '/recordings', 'key': 'recordings'},
             {'icon': 'sparkles', 'label': 'Find Consultant', 'href': '/app/consultants', 'key': 'consultants'},
             {'icon': 'user', 'label': 'Profile', 'href': '/app/profile', 'key': 'profile'}
-        ]
+        )
+
+# ============================================================================
+# AUTH DEPENDENCIES
+# ============================================================================
+
+CONSULTANT_CACHE_TTL = 600
+
+class CurrentConsultant(NamedTuple):
+    user_id: int
+    profile_id: int
+    specialization: Optional[str]
+
+def consultant_cache_key(user_id: int) -> str:
+    """Cache key for a consultant's profile lookup"""
+    return f"consultant:{user_id}"
+
+def lookup_consultant(db: Session, user_id: int) -> Optional[CurrentConsultant]:
+    """Resolve a user's consultant profile, served from cache when possible"""
+    cache_key = consultant_cache_key(user_id)
+    cached = shared_cache.get_json(cache_key)
+    if cached is not None:
+        return CurrentConsultant(user_id, cached["profile_id"], cached["specialization"])
+    
+    row = db.query(ConsultantProfile.id, ConsultantProfile.specialization).filter(
+        ConsultantProfile.user_id == user_id
+    ).first()
+    if not row:
+        return None
+    
+    shared_cache.set_json(cache_key, {"profile_id": row.id, "specialization": row.specialization}, CONSULTANT_CACHE_TTL)
+    return CurrentConsultant(user_id, row.id, row.specialization)
+
+def require_consultant(request: Request, db: Session = Depends(get_db)) -> CurrentConsultant:
+    """Dependency for consultant-only API endpoints; raises 401/403 otherwise"""
+    user_id = request.session.get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    consultant = lookup_consultant(db, user_id)
+    if not consultant:
+        raise HTTPException(status_code=403, detail="Not a consultant")
+    return consultant
 
 # ============================================================================
 # MARKETING ROUTES
@@ -142,7 +279,7 @@ async def user_dashboard(request: Request, db: Session = Depends(get_db)):
     """User dashboard - main authenticated area"""
     # TODO: Add authentication check
     # Get user data from session, fallback to default
-    print(f"DEBUG: Session data: {dict(request.session)}")
+    logger.debug("Session data: %s", dict(request.session))
     user_name = request.session.get("user_name", "User")
     user_id = request.session.get("user_id")
     
@@ -193,12 +330,12 @@ async def user_dashboard(request: Request, db: Session = Depends(get_db)):
         VitalsRecord.user_id == user_id
     ).order_by(VitalsRecord.timestamp.desc()).first()
         
-    print(f"DEBUG: latest_vitals = {latest_vitals}")
+    logger.debug("latest_vitals = %s", latest_vitals)
     if latest_vitals:
         heart_rate_display = latest_vitals.heart_rate
-        print(f"DEBUG: Setting heart_rate_display = {heart_rate_display}")
+        logger.debug("Setting heart_rate_display = %s", heart_rate_display)
     else:
-        print(f"DEBUG: No vitals found for user_id={user_id}")
+        logger.debug("No vitals found for user_id=%s", user_id)
     
     # Get count of mood entries (journal entries)
     from models import MoodEntry, ConsultantInteraction
@@ -266,7 +403,9 @@ async def get_patient_history(patient_id: int, request: Request, db: Session = D
         
     # Gather data
     # 1. Past Wellness Summary Reports
-    prescriptions = db.query(Prescription).filter(Prescription.user_id == patient_id).order_by(Prescription.created_at.desc()).all()
+    prescriptions = db.query(Prescription).options(
+        selectinload(Prescription.items).load_only(PrescriptionItem.medication_name)
+    ).filter(Prescription.user_id == patient_id).order_by(Prescription.created_at.desc()).all()
     rx_summary = []
     for rx in prescriptions:
         rx_summary.append({
@@ -276,7 +415,12 @@ async def get_patient_history(patient_id: int, request: Request, db: Session = D
         })
         
     # 2. Past Appointments & Notes
-    appointments = db.query(Appointment).filter(
+    appointments = db.query(Appointment).options(
+        joinedload(Appointment.consultant).options(
+            load_only(ConsultantProfile.specialization),
+            joinedload(ConsultantProfile.user).load_only(User.name)
+        )
+    ).filter(
         Appointment.user_id == patient_id, 
         Appointment.status == "completed"
     ).order_by(Appointment.appointment_date.desc()).limit(5).all()
@@ -400,8 +544,8 @@ def calculate_health_score(vitals_data: dict, db: Session = None, user_id: int =
                     if merged_data.get("temperature") is None and r.temperature: merged_data["temperature"] = r.temperature
                     if merged_data.get("blood_pressure_systolic") is None and r.blood_pressure_systolic: merged_data["blood_pressure_systolic"] = r.blood_pressure_systolic
                     if merged_data.get("blood_pressure_diastolic") is None and r.blood_pressure_diastolic: merged_data["blood_pressure_diastolic"] = r.blood_pressure_diastolic
-        except Exception as e:
-            print(f"Error fetching historical vitals for score: {e}")
+        except Exception:
+            logger.exception("Error fetching historical vitals for score")
 
     scores = []
     
@@ -506,6 +650,7 @@ async def save_vitals(request: Request, db: Session = Depends(get_db)):
         db.add(vitals_record)
         db.commit()
         db.refresh(vitals_record)
+        await cache.adelete(patient_health_cache_key(user_id))
         
         # AUDIT LOG: Vitals Recorded
         AuditLogger.log_event(
@@ -535,9 +680,7 @@ async def save_vitals(request: Request, db: Session = Depends(get_db)):
         
         return {"success": True, "entry": vitals_entry}
     except Exception as e:
-        print(f"Error saving vitals: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error saving vitals")
         db.rollback()
         return {"success": False, "error": str(e)}
 
@@ -585,9 +728,7 @@ async def get_vitals_history(request: Request, db: Session = Depends(get_db)):
         
         return {"success": True, "history": vitals_history}
     except Exception as e:
-        print(f"Error getting vitals history: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error getting vitals history")
         return {"success": False, "error": str(e), "history": []}
 
 # ============================================================================
@@ -620,6 +761,7 @@ async def save_mood(request: Request, db: Session = Depends(get_db)):
         db.add(mood_entry)
         db.commit()
         db.refresh(mood_entry)
+        await cache.adelete(patient_health_cache_key(user_id))
         
         # AUDIT LOG: Mood Recorded
         AuditLogger.log_event(
@@ -641,7 +783,7 @@ async def save_mood(request: Request, db: Session = Depends(get_db)):
             }
         }
     except Exception as e:
-        print(f"Error saving mood: {str(e)}")
+        logger.exception("Error saving mood")
         db.rollback()
         return {"success": False, "error": str(e)}
 
@@ -672,7 +814,7 @@ async def get_latest_mood(request: Request, db: Session = Depends(get_db)):
         else:
             return {"success": True, "mood": None}
     except Exception as e:
-        print(f"Error getting latest mood: {str(e)}")
+        logger.exception("Error getting latest mood")
         return {"success": False, "error": str(e), "mood": None}
 
 @app.get("/app/messages", response_class=HTMLResponse)
@@ -821,9 +963,7 @@ async def save_user_profile(request: Request, db: Session = Depends(get_db)):
         
         return {"success": True}
     except Exception as e:
-        print(f"Error saving user profile: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error saving user profile")
         db.rollback()
         return {"success": False, "error": str(e)}
 
@@ -946,21 +1086,22 @@ async def consultant_clients(request: Request, db: Session = Depends(get_db)):
         # Get unique client IDs
         client_ids = list(set([appt.user_id for appt in appointments]))
         
-        # Get client details
-        for client_id in client_ids:
-            user = db.query(User).filter(User.id == client_id).first()
-            if user:
-                # Count appointments
-                total_sessions = len([a for a in appointments if a.user_id == client_id and a.status == 'completed'])
-                upcoming_sessions = len([a for a in appointments if a.user_id == client_id and a.status == 'scheduled'])
-                
-                clients.append({
-                    "id": user.id,
-                    "name": user.name,
-                    "email": user.email,
-                    "total_sessions": total_sessions,
-                    "upcoming_sessions": upcoming_sessions
-                })
+        # Get client details in one query
+        client_users = db.query(User).options(
+            load_only(User.id, User.name, User.email), raiseload("*")
+        ).filter(User.id.in_(client_ids)).all() if client_ids else []
+        for user in client_users:
+            # Count appointments
+            total_sessions = len([a for a in appointments if a.user_id == user.id and a.status == 'completed'])
+            upcoming_sessions = len([a for a in appointments if a.user_id == user.id and a.status == 'scheduled'])
+            
+            clients.append({
+                "id": user.id,
+                "name": user.name,
+                "email": user.email,
+                "total_sessions": total_sessions,
+                "upcoming_sessions": upcoming_sessions
+            })
     
     return templates.TemplateResponse(
         "pages/consultant_clients.html",
@@ -1069,12 +1210,13 @@ async def save_consultant_profile(request: Request, db: Session = Depends(get_db
         consultant_profile.bio = data.get("bio")
         
         db.commit()
+        refresh_admin_consultants_view(db)
+        shared_cache.delete(consultant_cache_key(user_id))
+        cache.delete(ADMIN_CONSULTANTS_CACHE_KEY)
         
         return {"success": True}
     except Exception as e:
-        print(f"Error saving consultant profile: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error saving consultant profile")
         db.rollback()
         return {"success": False, "error": str(e)}
 
@@ -1115,7 +1257,7 @@ async def login_post(request: Request, db: Session = Depends(get_db)):
         
 
         # Check if user exists and password is correct
-        if not user or not user.verify_password(user_password):
+        if not user or not await user.verify_password_async(user_password):
             # AUDIT LOG: Failed Login
             AuditLogger.log_event(
                 db, 
@@ -1174,8 +1316,8 @@ async def login_post(request: Request, db: Session = Depends(get_db)):
         else:
             return RedirectResponse(url="/app", status_code=303)
             
-    except Exception as e:
-        print(f"Login error: {str(e)}")
+    except Exception:
+        logger.exception("Login error")
         return templates.TemplateResponse(
             "pages/auth/login.html",
             {
@@ -1235,8 +1377,7 @@ async def send_otp(request: Request, db: Session = Depends(get_db)):
             
         # Generate cryptographically secure OTP
         # Using secrets module for HIPAA-compliant random generation
-        import secrets as crypto_secrets
-        otp = ''.join([str(crypto_secrets.randbelow(10)) for _ in range(6)])
+        otp = f"{secrets.randbelow(1000000):06d}"
         
         # Store in DB (invalidate old OTP for this phone)
         db.query(OTPVerification).filter(OTPVerification.phone_number == phone).delete()
@@ -1265,9 +1406,9 @@ async def send_otp(request: Request, db: Session = Depends(get_db)):
         # Check if OTP was sent successfully
         if send_result.get("success"):
             providers = send_result.get('providers', [send_result.get('provider', 'Unknown')])
-            print(f"[OTP] ✅ OTP sent via {', '.join(providers) if isinstance(providers, list) else providers}")
+            logger.info("OTP sent via %s", ', '.join(providers) if isinstance(providers, list) else providers)
         else:
-            print(f"[OTP] ⚠️ Failed to send OTP: {send_result.get('message')}")
+            logger.warning("Failed to send OTP: %s", send_result.get('message'))
             # Still print to console as backup
             import sys
             print(f"\n{'='*60}", flush=True, file=sys.stderr)
@@ -1303,9 +1444,7 @@ async def send_otp(request: Request, db: Session = Depends(get_db)):
             status="failure",
             request=request
         )
-        print(f"Error sending OTP: {e}", flush=True, file=sys.stderr)
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error sending OTP")
         return {"success": False, "error": "Internal server error"}
 
 @app.post("/signup")
@@ -1351,6 +1490,7 @@ async def signup_post(request: Request, db: Session = Depends(get_db)):
             otp_record = db.query(OTPVerification).filter(
                 OTPVerification.phone_number == phone_number,
                 OTPVerification.otp_code == otp_input,
+                OTPVerification.is_verified == False,
                 OTPVerification.expires_at > datetime.utcnow()
             ).first()
             
@@ -1365,7 +1505,7 @@ async def signup_post(request: Request, db: Session = Depends(get_db)):
                 )
         else:
             # OTP bypass enabled - skip verification
-            print("[SIGNUP] ⚠️ OTP verification bypassed (BYPASS_OTP_VERIFICATION=true)")
+            logger.warning("OTP verification bypassed (BYPASS_OTP_VERIFICATION=true)")
             otp_record = None
             
         # 2. Check uniqueness
@@ -1397,7 +1537,7 @@ async def signup_post(request: Request, db: Session = Depends(get_db)):
             phone_number=phone_number,
             is_active=True
         )
-        new_user.set_password(user_password)
+        await new_user.set_password_async(user_password)
         
         db.add(new_user)
         # Mark OTP as verified/used (delete it) - only if OTP was verified
@@ -1406,6 +1546,9 @@ async def signup_post(request: Request, db: Session = Depends(get_db)):
         
         db.commit()
         db.refresh(new_user)
+        if new_user.user_type == "consultant":
+            refresh_admin_consultants_view(db)
+        cache.delete(ADMIN_USERS_CACHE_KEY, ADMIN_CONSULTANTS_CACHE_KEY)
         
         # AUDIT LOG: User Registration
         AuditLogger.log_event(
@@ -1420,8 +1563,8 @@ async def signup_post(request: Request, db: Session = Depends(get_db)):
         # Send welcome email (optional, non-blocking)
         try:
             send_welcome_email(user_email, user_name)
-        except Exception as e:
-            print(f"Failed to send welcome email: {str(e)}")
+        except Exception:
+            logger.exception("Failed to send welcome email")
         
         # Store user data in session
         request.session["user_id"] = new_user.id
@@ -1436,9 +1579,7 @@ async def signup_post(request: Request, db: Session = Depends(get_db)):
             return RedirectResponse(url="/app", status_code=303)
             
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print(f"Signup error: {str(e)}")
+        logger.exception("Signup error")
         db.rollback()
         return templates.TemplateResponse(
             "pages/auth/signup_with_otp.html",
@@ -1485,8 +1626,8 @@ async def forgot_password_post(request: Request, db: Session = Depends(get_db)):
         user = db.query(User).filter(User.email == user_email).first()
         
         if user:
-            # Generate unique reset token
-            reset_token = str(uuid.uuid4())
+            # Generate unique, unguessable reset token
+            reset_token = secrets.token_urlsafe(32)
             
             # Create password reset token record
             token_record = PasswordResetToken(
@@ -1500,8 +1641,8 @@ async def forgot_password_post(request: Request, db: Session = Depends(get_db)):
             # Send password reset email
             try:
                 send_password_reset_email(user_email, reset_token, user.name)
-            except Exception as e:
-                print(f"Failed to send reset email: {str(e)}")
+            except Exception:
+                logger.exception("Failed to send reset email")
         
         # Always show success message (security best practice)
         return templates.TemplateResponse(
@@ -1513,8 +1654,8 @@ async def forgot_password_post(request: Request, db: Session = Depends(get_db)):
             }
         )
         
-    except Exception as e:
-        print(f"Forgot password error: {str(e)}")
+    except Exception:
+        logger.exception("Forgot password error")
         return templates.TemplateResponse(
             "pages/auth/forgot_password.html",
             {
@@ -1555,8 +1696,8 @@ async def reset_password(request: Request, token: str, db: Session = Depends(get
             }
         )
         
-    except Exception as e:
-        print(f"Reset password GET error: {str(e)}")
+    except Exception:
+        logger.exception("Reset password GET error")
         return templates.TemplateResponse(
             "pages/auth/reset_password.html",
             {
@@ -1641,7 +1782,7 @@ async def reset_password_post(request: Request, token: str, db: Session = Depend
             )
         
         # Update password
-        user.set_password(new_password)
+        await user.set_password_async(new_password)
         
         # Mark token as used
         token_record.used = True
@@ -1658,8 +1799,8 @@ async def reset_password_post(request: Request, token: str, db: Session = Depend
             }
         )
         
-    except Exception as e:
-        print(f"Reset password POST error: {str(e)}")
+    except Exception:
+        logger.exception("Reset password POST error")
         db.rollback()
         return templates.TemplateResponse(
             "pages/auth/reset_password.html",
@@ -1769,7 +1910,9 @@ async def get_consultant_schedule(consultant_id: int, db: Session = Depends(get_
     """Get consultant's availability schedule"""
     try:
         # Get consultant profile
-        consultant = db.query(ConsultantProfile).filter(
+        consultant = db.query(ConsultantProfile).options(
+            joinedload(ConsultantProfile.user).load_only(User.name)
+        ).filter(
             ConsultantProfile.id == consultant_id
         ).first()
         
@@ -1818,7 +1961,7 @@ async def get_consultant_schedule(consultant_id: int, db: Session = Depends(get_
             "booked_slots": booked_slots
         }
     except Exception as e:
-        print(f"Error getting consultant schedule: {str(e)}")
+        logger.exception("Error getting consultant schedule")
         return {"success": False, "error": str(e)}
 
 @app.post("/api/appointments/book")
@@ -1839,7 +1982,9 @@ async def book_appointment(request: Request, db: Session = Depends(get_db)):
         appointment_date = datetime.fromisoformat(data["appointment_date"].replace("Z", "+00:00"))
         
         # Check if consultant exists
-        consultant = db.query(ConsultantProfile).filter(
+        consultant = db.query(ConsultantProfile).options(
+            joinedload(ConsultantProfile.user).load_only(User.name)
+        ).filter(
             ConsultantProfile.id == data["consultant_id"]
         ).first()
         
@@ -1868,6 +2013,8 @@ async def book_appointment(request: Request, db: Session = Depends(get_db)):
         db.add(appointment)
         db.commit()
         db.refresh(appointment)
+        if appointment.notes:
+            await shared_cache.adelete(patient_notes_cache_key(consultant.user_id, user_id))
         
         return {
             "success": True,
@@ -1880,7 +2027,7 @@ async def book_appointment(request: Request, db: Session = Depends(get_db)):
             }
         }
     except Exception as e:
-        print(f"Error booking appointment: {str(e)}")
+        logger.exception("Error booking appointment")
         db.rollback()
         return {"success": False, "error": str(e)}
 
@@ -1892,7 +2039,13 @@ async def get_user_appointments(request: Request, db: Session = Depends(get_db))
         if not user_id:
             return {"success": False, "error": "User not logged in", "appointments": []}
         
-        appointments = db.query(Appointment).filter(
+        # Eager-load only the consultant columns rendered below
+        appointments = db.query(Appointment).options(
+            joinedload(Appointment.consultant).options(
+                load_only(ConsultantProfile.specialization),
+                joinedload(ConsultantProfile.user).load_only(User.name, User.email)
+            )
+        ).filter(
             Appointment.user_id == user_id
         ).order_by(Appointment.appointment_date.desc()).all()
         
@@ -1910,7 +2063,7 @@ async def get_user_appointments(request: Request, db: Session = Depends(get_db))
         
         return {"success": True, "appointments": appointment_list}
     except Exception as e:
-        print(f"Error getting user appointments: {str(e)}")
+        logger.exception("Error getting user appointments")
         return {"success": False, "error": str(e), "appointments": []}
 
 @app.get("/api/appointments/consultant")
@@ -1931,7 +2084,9 @@ async def get_consultant_appointments(request: Request, db: Session = Depends(ge
         if not consultant_profile:
             return {"success": False, "error": "Consultant profile not found", "appointments": []}
         
-        appointments = db.query(Appointment).filter(
+        appointments = db.query(Appointment).options(
+            joinedload(Appointment.user).load_only(User.name, User.email)
+        ).filter(
             Appointment.consultant_id == consultant_profile.id
         ).order_by(Appointment.appointment_date.desc()).all()
         
@@ -1949,7 +2104,7 @@ async def get_consultant_appointments(request: Request, db: Session = Depends(ge
         
         return {"success": True, "appointments": appointment_list}
     except Exception as e:
-        print(f"Error getting consultant appointments: {str(e)}")
+        logger.exception("Error getting consultant appointments")
         return {"success": False, "error": str(e), "appointments": []}
 
 @app.post("/api/appointments/{appointment_id}/cancel")
@@ -1983,7 +2138,7 @@ async def cancel_appointment(appointment_id: int, request: Request, db: Session
         
         return {"success": True, "message": "Appointment cancelled successfully"}
     except Exception as e:
-        print(f"Error cancelling appointment: {str(e)}")
+        logger.exception("Error cancelling appointment")
         db.rollback()
         return {"success": False, "error": str(e)}
 
@@ -2018,10 +2173,11 @@ async def update_appointment_notes(appointment_id: int, request: Request, db: Se
         
         appointment.notes = notes
         db.commit()
+        await shared_cache.adelete(patient_notes_cache_key(user_id, appointment.user_id))
         
         return {"success": True}
     except Exception as e:
-        print(f"Error updating notes: {str(e)}")
+        logger.exception("Error updating notes")
         return {"success": False, "error": str(e)}
 
 # ============================================================================
@@ -2064,7 +2220,7 @@ async def send_message(request: Request, db: Session = Depends(get_db)):
             }
         }
     except Exception as e:
-        print(f"Error sending message: {str(e)}")
+        logger.exception("Error sending message")
         db.rollback()
         return {"success": False, "error": str(e)}
 
@@ -2136,7 +2292,7 @@ async def get_conversations(request: Request, db: Session = Depends(get_db)):
         
         return {"success": True, "conversations": conversations}
     except Exception as e:
-        print(f"Error getting conversations: {str(e)}")
+        logger.exception("Error getting conversations")
         return {"success": False, "error": str(e)}
 
 @app.get("/api/messages/thread/{partner_id}")
@@ -2182,7 +2338,7 @@ async def get_message_thread(partner_id: int, request: Request, db: Session = De
             "messages": message_list
         }
     except Exception as e:
-        print(f"Error getting message thread: {str(e)}")
+        logger.exception("Error getting message thread")
         return {"success": False, "error": str(e)}
 
 @app.post("/api/messages/mark-read/{partner_id}")
@@ -2204,7 +2360,7 @@ async def mark_messages_read(partner_id: int, request: Request, db: Session = De
         
         return {"success": True}
     except Exception as e:
-        print(f"Error marking messages as read: {str(e)}")
+        logger.exception("Error marking messages as read")
         db.rollback()
         return {"success": False, "error": str(e)}
 
@@ -2212,6 +2368,43 @@ async def mark_messages_read(partner_id: int, request: Request, db: Session = De
 # AI CHAT API ENDPOINTS
 # ============================================================================
 
+async def load_ai_chat_context(db: Session, user_id: int) -> list:
+    """
+    Recent messages to send along with a new AI chat message
+    Comes from conversation memory, rebuilt from the database when it is cold
+    (no Redis, new worker, Redis flushed, expired)
+    """
+    conversation_history = await conversation_memory.aget_window(user_id)
+    if not conversation_history:
+        recent_chats = db.query(AIChatHistory).filter(
+            AIChatHistory.user_id == user_id
+        ).order_by(AIChatHistory.timestamp.desc()).limit(WINDOW_SIZE // 2).all()
+        for chat in reversed(recent_chats):
+            conversation_history.append({"content": chat.message, "is_user": True})
+            conversation_history.append({"content": chat.response, "is_user": False})
+            await conversation_memory.aadd_turn(user_id, chat.message, chat.response)
+    return conversation_history
+
+def ai_facts_kwargs(backend, facts: dict) -> dict:
+    """Long-term facts for the prompt, for backends that can extract them (Ollama, OpenAI)"""
+    return {"facts": facts} if hasattr(backend, "aextract_facts") else {}
+
+async def ai_reply_stream(backend, message: str, conversation_history: list, facts: dict = None):
+    """Yield the AI reply in chunks; backends that can't stream send it as one chunk"""
+    kwargs = ai_facts_kwargs(backend, facts)
+    if hasattr(backend, "achat_stream"):
+        async for delta in backend.achat_stream(message, conversation_history, **kwargs):
+            yield delta
+    elif hasattr(backend, "chat_stream"):
+        # Sync streaming clients (Vertex AI) block between chunks, so pull them in the threadpool
+        async for delta in iterate_in_threadpool(backend.chat_stream(message, conversation_history, **kwargs)):
+            yield delta
+    else:
+        yield await run_in_threadpool(backend.chat, message, conversation_history, **kwargs)
+
+def sse_event(data: dict) -> bytes:
+    return b"data: " + orjson.dumps(data) + b"\n\n"
+
 @app.post("/api/ai-chat/send")
 async def send_ai_chat(request: Request, db: Session = Depends(get_db)):
     """Send a message to AI assistant and get response"""
@@ -2226,20 +2419,12 @@ async def send_ai_chat(request: Request, db: Session = Depends(get_db)):
         if not message:
             return {"success": False, "error": "Message is required"}
         
-        # Get recent conversation history for context
-        recent_chats = db.query(AIChatHistory).filter(
-            AIChatHistory.user_id == user_id
-        ).order_by(AIChatHistory.timestamp.desc()).limit(5).all()
-        
-        # Build conversation history
-        conversation_history = []
-        for chat in reversed(recent_chats):
-            conversation_history.append({"content": chat.message, "is_user": True})
-            conversation_history.append({"content": chat.response, "is_user": False})
+        conversation_history = await load_ai_chat_context(db, user_id)
+        facts = await conversation_memory.aget_facts(user_id)
         
         # Get AI response using Gemini API
         from gemini_chat import gemini_chat
-        ai_response = gemini_chat.chat(message, conversation_history)
+        ai_response = gemini_chat.chat(message, conversation_history, **ai_facts_kwargs(gemini_chat, facts))
         
         # Save to database
         chat_entry = AIChatHistory(
@@ -2250,6 +2435,9 @@ async def send_ai_chat(request: Request, db: Session = Depends(get_db)):
         db.add(chat_entry)
         db.commit()
         db.refresh(chat_entry)
+        await conversation_memory.aremember_turn(
+            user_id, message, ai_response, extract_facts=getattr(gemini_chat, "aextract_facts", None)
+        )
         
         return {
             "success": True,
@@ -2257,14 +2445,61 @@ async def send_ai_chat(request: Request, db: Session = Depends(get_db)):
             "timestamp": chat_entry.timestamp.isoformat()
         }
     except Exception as e:
-        import traceback
-        error_msg = f"Error in AI chat: {str(e)}\n\nTraceback:\n{traceback.format_exc()}"
-        print(error_msg)
-        with open("debug_error.log", "w") as f:
-            f.write(error_msg)
+        logger.exception("Error in AI chat")
         db.rollback()
         return {"success": False, "error": f"Failed to get AI response: {str(e)}"}
 
+@app.post("/api/ai-chat/stream")
+async def stream_ai_chat(request: Request, db: Session = Depends(get_db)):
+    """
+    Send a message to AI assistant and stream the response as server-sent events
+    Each event is {"delta": text} and the last one {"done": true, "timestamp": ...}
+    """
+    user_id = request.session.get("user_id")
+    if not user_id:
+        return {"success": False, "error": "Not authenticated"}
+    
+    data = await request.json()
+    message = data.get("message", "").strip()
+    if not message:
+        return {"success": False, "error": "Message is required"}
+    
+    conversation_history = await load_ai_chat_context(db, user_id)
+    facts = await conversation_memory.aget_facts(user_id)
+    
+    async def events():
+        parts = []
+        try:
+            # Resolved here so a missing or failing backend becomes an error event
+            from gemini_chat import gemini_chat
+            async for delta in ai_reply_stream(gemini_chat, message, conversation_history, facts):
+                parts.append(delta)
+                yield sse_event({"delta": delta})
+            
+            ai_response = "".join(parts)
+            # The request's session may already be closed once streaming starts
+            stream_db = get_db_session()
+            try:
+                chat_entry = AIChatHistory(user_id=user_id, message=message, response=ai_response)
+                stream_db.add(chat_entry)
+                stream_db.commit()
+                timestamp = chat_entry.timestamp.isoformat()
+            finally:
+                stream_db.close()
+            await conversation_memory.aremember_turn(
+                user_id, message, ai_response, extract_facts=getattr(gemini_chat, "aextract_facts", None)
+            )
+            yield sse_event({"done": True, "timestamp": timestamp})
+        except Exception as e:
+            logger.exception("Error streaming AI chat")
+            yield sse_event({"error": f"Failed to get AI response: {str(e)}"})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/ai-chat/history")
 async def get_ai_chat_history(request: Request, db: Session = Depends(get_db)):
     """Get AI chat history for current user"""
@@ -2289,13 +2524,27 @@ async def get_ai_chat_history(request: Request, db: Session = Depends(get_db)):
         
         return {"success": True, "history": history}
     except Exception as e:
-        print(f"Error getting AI chat history: {str(e)}")
+        logger.exception("Error getting AI chat history")
         return {"success": False, "error": str(e)}
 
+# The status endpoint is polled from the UI, so keep the availability probe
+# result for a few seconds instead of hitting the AI backend on every poll
+AI_STATUS_TTL_SECONDS = 5
+_ai_status_cache = {"expires_at": 0.0, "available": False}
+
+def get_ai_availability() -> bool:
+    """Return the AI backend availability, re-probing at most every few seconds"""
+    now = time.monotonic()
+    if now >= _ai_status_cache["expires_at"]:
+        _ai_status_cache["available"] = vertex_chat.is_available()
+        _ai_status_cache["expires_at"] = now + AI_STATUS_TTL_SECONDS
+    return _ai_status_cache["available"]
+
 @app.get("/api/ai-chat/status")
-async def get_ai_chat_status():
+async def get_ai_chat_status(response: Response):
     """Check if AI chat service is available"""
-    is_available = vertex_chat.is_available()
+    is_available = get_ai_availability()
+    response.headers["Cache-Control"] = f"public, max-age={AI_STATUS_TTL_SECONDS}"
     return {
         "available": is_available,
         "model": vertex_chat.model_name if is_available else None
@@ -2315,10 +2564,11 @@ async def reset_ai_chat(request: Request, db: Session = Depends(get_db)):
         ).delete()
         
         db.commit()
+        await conversation_memory.aclear(user_id)
         
         return {"success": True}
     except Exception as e:
-        print(f"Error resetting chat: {str(e)}")
+        logger.exception("Error resetting chat")
         db.rollback()
         return {"success": False, "error": str(e)}
 
@@ -2453,70 +2703,89 @@ async def call_room(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"ERROR in call_room: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERROR in call_room")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 # ============================================================================
 # PATIENT HEALTH DATA API (for Consultant Call Room)
 # ============================================================================
 
+# Consultants refresh a patient's charts repeatedly during a call, so the
+# payload is cached briefly and dropped whenever new vitals or moods are saved
+PATIENT_HEALTH_CACHE_TTL = 30
+
+def patient_health_cache_key(user_id: int) -> str:
+    """Cache key for a patient's health-data payload"""
+    return f"phd:{user_id}"
+
 @app.get("/api/patient/{user_id}/health-data")
 async def get_patient_health_data(
     user_id: int,
-    request: Request,
-    db: Session = Depends(get_db)
+    consultant: CurrentConsultant = Depends(require_consultant),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get patient's vitals and mood data for consultant view"""
     try:
-        # Verify consultant is logged in
-        consultant_user_id = request.session.get("user_id")
-        user_type = request.session.get("user_type")
-        
-        if not consultant_user_id or user_type != "consultant":
-            return {"success": False, "error": "Not authorized"}
-        
-        # Get last 7 vitals readings
-        vitals = db.query(VitalsRecord).filter(
-            VitalsRecord.user_id == user_id
-        ).order_by(VitalsRecord.timestamp.desc()).limit(7).all()
+        cache_key = patient_health_cache_key(user_id)
+        cached = await cache.aget_json(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Get last 7 vitals readings; project just the charted columns
+        # so rows come back as plain tuples instead of ORM instances
+        vitals = (await db.execute(
+            select(
+                VitalsRecord.timestamp,
+                VitalsRecord.heart_rate,
+                VitalsRecord.blood_pressure_systolic,
+                VitalsRecord.blood_pressure_diastolic,
+                VitalsRecord.temperature,
+                VitalsRecord.respiratory_rate,
+                VitalsRecord.spo2
+            ).where(
+                VitalsRecord.user_id == user_id
+            ).order_by(VitalsRecord.timestamp.desc()).limit(7)
+        )).all()
         
         # Get last 7 mood entries
-        moods = db.query(MoodEntry).filter(
-            MoodEntry.user_id == user_id
-        ).order_by(MoodEntry.timestamp.desc()).limit(7).all()
+        moods = (await db.execute(
+            select(MoodEntry.timestamp, MoodEntry.mood_rating, MoodEntry.notes).where(
+                MoodEntry.user_id == user_id
+            ).order_by(MoodEntry.timestamp.desc()).limit(7)
+        )).all()
         
         # Format vitals data
         vitals_data = []
-        for vital in reversed(vitals):  # Reverse to show oldest first
+        for timestamp, heart_rate, systolic, diastolic, temperature, respiratory_rate, spo2 in reversed(vitals):  # Reverse to show oldest first
             vitals_data.append({
-                "date": vital.timestamp.strftime("%b %d, %H:%M"),
-                "heart_rate": vital.heart_rate,
-                "blood_pressure_systolic": vital.blood_pressure_systolic,
-                "blood_pressure_diastolic": vital.blood_pressure_diastolic,
-                "temperature": vital.temperature,
-                "respiratory_rate": vital.respiratory_rate,
-                "oxygen_saturation": vital.spo2
+                "date": format_short_datetime(timestamp),
+                "heart_rate": heart_rate,
+                "blood_pressure_systolic": systolic,
+                "blood_pressure_diastolic": diastolic,
+                "temperature": temperature,
+                "respiratory_rate": respiratory_rate,
+                "oxygen_saturation": spo2
             })
         
         # Format mood data
         mood_data = []
-        for mood in reversed(moods):  # Reverse to show oldest first
+        for timestamp, mood_rating, notes in reversed(moods):  # Reverse to show oldest first
             mood_data.append({
-                "date": mood.timestamp.strftime("%b %d, %H:%M"),
-                "mood": mood.mood_rating,
-                "notes": mood.notes
+                "date": format_short_datetime(timestamp),
+                "mood": mood_rating,
+                "notes": notes
             })
         
-        return {
+        health_data = {
             "success": True,
             "vitals": vitals_data,
             "moods": mood_data
         }
+        await cache.aset_json(cache_key, health_data, PATIENT_HEALTH_CACHE_TTL)
+        return health_data
         
     except Exception as e:
-        print(f"Error fetching patient health data: {str(e)}")
+        logger.exception("Error fetching patient health data")
         return {"success": False, "error": str(e)}
 
 # ============================================================================
@@ -2526,7 +2795,7 @@ async def get_patient_health_data(
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "SolaceSquad"}
+    return {"status": "healthy", "service": "SolaceSquad", "db_pool": get_pool_stats()}
 
 # ============================================================================
 # RUN APPLICATION
@@ -2546,14 +2815,13 @@ if __name__ == "__main__":
 # ============================================================================
 
 @app.get("/consultant/prescriptions", response_class=HTMLResponse)
-async def consultant_prescriptions(request: Request, db: Session = Depends(get_db)):
+def consultant_prescriptions(request: Request, db: Session = Depends(get_db)):
     """Consultant prescription creation page"""
     user_id = request.session.get("user_id")
     if not user_id:
         return RedirectResponse(url="/login", status_code=302)
         
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user or user.user_type != "consultant":
+    if request.session.get("user_type") != "consultant":
         return RedirectResponse(url="/app", status_code=302)
         
     user_name = request.session.get("user_name", "Consultant")
@@ -2561,14 +2829,17 @@ async def consultant_prescriptions(request: Request, db: Session = Depends(get_d
     initials = name_parts[0][0].upper() + (name_parts[1][0].upper() if len(name_parts) > 1 else name_parts[0][:2].upper())
 
     # Get consultant profile
-    consultant_profile = db.query(ConsultantProfile).filter(ConsultantProfile.user_id == user_id).first()
+    consultant = lookup_consultant(db, user_id)
     
     clients = []
-    if consultant_profile:
-        # Fetch clients who have had appointments with this consultant
-        clients = db.query(User).join(Appointment, Appointment.user_id == User.id)\
-            .filter(Appointment.consultant_id == consultant_profile.id)\
-            .group_by(User.id).all()
+    if consultant:
+        # Fetch clients who have had appointments with this consultant; the
+        # template only renders the client picker, so id and name are enough
+        client_ids = db.query(Appointment.user_id)\
+            .filter(Appointment.consultant_id == consultant.profile_id)\
+            .distinct().subquery()
+        clients = db.query(User).options(load_only(User.id, User.name))\
+            .filter(User.id.in_(select(client_ids))).all()
             
     return templates.TemplateResponse(
         "pages/consultant_prescription.html",
@@ -2600,7 +2871,7 @@ class PrescriptionModel(BaseModel):
     items: List[PrescriptionItemModel]
 
 @app.post("/api/consultant/prescriptions")
-async def create_prescription(data: PrescriptionModel, request: Request, db: Session = Depends(get_db)):
+def create_prescription(data: PrescriptionModel, request: Request, db: Session = Depends(get_db)):
     user_id = request.session.get("user_id")
     if not user_id:
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -2620,17 +2891,12 @@ async def create_prescription(data: PrescriptionModel, request: Request, db: Ses
         db.add(prescription)
         db.flush() # get ID
         
-        # Add items
-        for item in data.items:
-            db_item = PrescriptionItem(
-                prescription_id=prescription.id,
-                medication_name=item.medication_name,
-                dosage=item.dosage,
-                frequency=item.frequency,
-                duration=item.duration,
-                instructions=item.instructions
+        # Add items in a single executemany INSERT
+        if data.items:
+            db.execute(
+                insert(PrescriptionItem),
+                [dict(prescription_id=prescription.id, **item.model_dump()) for item in data.items]
             )
-            db.add(db_item)
             
         db.commit()
         
@@ -2645,9 +2911,12 @@ async def create_prescription(data: PrescriptionModel, request: Request, db: Ses
         )
         
         return {"success": True, "id": prescription.id}
-    except Exception as e:
+    except SQLAlchemyError as e:
         db.rollback()
-        print(f"Error creating prescription: {e}")
+        logger.exception("Error creating prescription")
+        return {"success": False, "error": str(e)}
+    except Exception as e:
+        logger.exception("Error creating prescription")
         return {"success": False, "error": str(e)}
 
 # ============================================================================
@@ -2658,18 +2927,22 @@ async def create_prescription(data: PrescriptionModel, request: Request, db: Ses
 async def save_consultation_notes(
     appointment_id: int,
     request: Request,
+    consultant: CurrentConsultant = Depends(require_consultant),
     db: Session = Depends(get_db)
 ):
     """Save consultation notes for an appointment"""
+    # Get request body, then run the blocking DB work off the event loop
     try:
-        user_id = request.session.get("user_id")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Not authenticated")
-        
-        # Get request body
         body = await request.json()
-        notes = body.get("notes", "")
-        
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+    notes = body.get("notes", "")
+    return await run_in_threadpool(_save_consultation_notes, db, appointment_id, consultant, notes)
+
+
+def _save_consultation_notes(db: Session, appointment_id: int, consultant: CurrentConsultant, notes: str) -> dict:
+    """Persist consultation notes if the user is the appointment's consultant"""
+    try:
         # Get appointment
         appointment = db.query(Appointment).filter(
             Appointment.id == appointment_id
@@ -2679,21 +2952,21 @@ async def save_consultation_notes(
             return {"success": False, "error": "Appointment not found"}
         
         # Verify user is the consultant for this appointment
-        consultant_profile = db.query(ConsultantProfile).filter(
-            ConsultantProfile.user_id == user_id
-        ).first()
-        
-        if not consultant_profile or appointment.consultant_id != consultant_profile.id:
+        if appointment.consultant_id != consultant.profile_id:
             return {"success": False, "error": "Unauthorized"}
         
         # Update notes
         appointment.notes = notes
         db.commit()
+        shared_cache.delete(patient_notes_cache_key(consultant.user_id, appointment.user_id))
         
         return {"success": True, "message": "Notes saved successfully"}
-    except Exception as e:
+    except SQLAlchemyError as e:
         db.rollback()
-        print(f"Error saving notes: {e}")
+        logger.exception("Error saving notes")
+        return {"success": False, "error": str(e)}
+    except Exception as e:
+        logger.exception("Error saving notes")
         return {"success": False, "error": str(e)}
 
 
@@ -2701,8 +2974,65 @@ async def save_consultation_notes(
 # VIEW PRESCRIPTIONS
 # ============================================================================
 
+PRESCRIPTION_PDF_CACHE_TTL = 86400
+PDF_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def prescription_pdf_etag(prescription_id: int) -> str:
+    """ETag for a prescription PDF; bump the version when the PDF layout changes"""
+    return f'"rx-{prescription_id}-v1"'
+
+
+def iter_pdf_chunks(pdf_bytes: bytes, chunk_size: int = PDF_STREAM_CHUNK_SIZE):
+    """Yield a PDF in fixed-size chunks for StreamingResponse"""
+    for start in range(0, len(pdf_bytes), chunk_size):
+        yield pdf_bytes[start:start + chunk_size]
+
+
+def load_prescription(db: Session, prescription_id: int):
+    """Fetch a prescription with its consultant and patient in one round-trip"""
+    return db.query(Prescription).options(
+        joinedload(Prescription.consultant).joinedload(User.consultant_profile),
+        joinedload(Prescription.user)
+    ).filter(Prescription.id == prescription_id).first()
+
+
+def load_prescription_items(db: Session, prescription_id: int) -> list:
+    """Fetch a prescription's items as plain dicts, skipping ORM hydration"""
+    rows = db.execute(
+        select(
+            PrescriptionItem.medication_name,
+            PrescriptionItem.dosage,
+            PrescriptionItem.frequency,
+            PrescriptionItem.duration,
+            PrescriptionItem.instructions
+        ).where(
+            PrescriptionItem.prescription_id == prescription_id
+        ).order_by(PrescriptionItem.id)
+    ).all()
+    return [dict(row._mapping) for row in rows]
+
+
+def format_prescription(prescription: Prescription, items: list) -> dict:
+    """Build the prescription payload shared by the JSON and PDF endpoints"""
+    consultant = prescription.consultant
+    consultant_profile = consultant.consultant_profile if consultant else None
+    patient = prescription.user
+    
+    return {
+        "id": prescription.id,
+        "created_at": prescription.created_at,
+        "diagnosis": prescription.diagnosis,
+        "notes": prescription.notes,
+        "consultant_name": consultant.name if consultant else "Unknown",
+        "consultant_specialization": consultant_profile.specialization if consultant_profile else "",
+        "patient_name": patient.name if patient else "Unknown",
+        "items": items
+    }
+
+
 @app.get("/api/prescriptions/{prescription_id}")
-async def get_prescription(
+def get_prescription(
     prescription_id: int,
     request: Request,
     db: Session = Depends(get_db)
@@ -2713,10 +3043,8 @@ async def get_prescription(
         if not user_id:
             raise HTTPException(status_code=401, detail="Not authenticated")
         
-        # Get prescription with items
-        prescription = db.query(Prescription).filter(
-            Prescription.id == prescription_id
-        ).first()
+        # Get prescription with consultant and patient
+        prescription = load_prescription(db, prescription_id)
         
         if not prescription:
             return {"success": False, "error": "Prescription not found"}
@@ -2725,46 +3053,20 @@ async def get_prescription(
         if prescription.user_id != user_id and prescription.consultant_id != user_id:
             return {"success": False, "error": "Unauthorized"}
         
-        # Get consultant info
-        consultant = db.query(User).filter(User.id == prescription.consultant_id).first()
-        consultant_profile = db.query(ConsultantProfile).filter(
-            ConsultantProfile.user_id == prescription.consultant_id
-        ).first()
-        
-        # Get patient info
-        patient = db.query(User).filter(User.id == prescription.user_id).first()
-        
-        # Format items
-        items = []
-        for item in prescription.items:
-            items.append({
-                "medication_name": item.medication_name,
-                "dosage": item.dosage,
-                "frequency": item.frequency,
-                "duration": item.duration,
-                "instructions": item.instructions
-            })
+        prescription_data = format_prescription(prescription, load_prescription_items(db, prescription_id))
+        prescription_data["created_at"] = prescription.created_at.isoformat()
         
         return {
             "success": True,
-            "prescription": {
-                "id": prescription.id,
-                "created_at": prescription.created_at.isoformat(),
-                "diagnosis": prescription.diagnosis,
-                "notes": prescription.notes,
-                "consultant_name": consultant.name if consultant else "Unknown",
-                "consultant_specialization": consultant_profile.specialization if consultant_profile else "",
-                "patient_name": patient.name if patient else "Unknown",
-                "items": items
-            }
+            "prescription": prescription_data
         }
     except Exception as e:
-        print(f"Error getting prescription: {e}")
+        logger.exception("Error getting prescription")
         return {"success": False, "error": str(e)}
 
 
 @app.get("/api/user/prescriptions")
-async def get_user_prescriptions(
+def get_user_prescriptions(
     request: Request,
     db: Session = Depends(get_db)
 ):
@@ -2774,30 +3076,33 @@ async def get_user_prescriptions(
         if not user_id:
             raise HTTPException(status_code=401, detail="Not authenticated")
         
-        # Get all prescriptions for this user
-        prescriptions = db.query(Prescription).filter(
+        # Get all prescriptions for this user, with consultant details and
+        # item counts loaded in the same query
+        prescriptions = db.query(Prescription).options(
+            joinedload(Prescription.consultant).joinedload(User.consultant_profile),
+            undefer(Prescription.item_count),
+            *STRICT_LOADING_OPTIONS
+        ).filter(
             Prescription.user_id == user_id
         ).order_by(Prescription.created_at.desc()).all()
         
         prescription_list = []
         for rx in prescriptions:
-            consultant = db.query(User).filter(User.id == rx.consultant_id).first()
-            consultant_profile = db.query(ConsultantProfile).filter(
-                ConsultantProfile.user_id == rx.consultant_id
-            ).first()
+            consultant = rx.consultant
+            consultant_profile = consultant.consultant_profile if consultant else None
             
             prescription_list.append({
                 "id": rx.id,
-                "created_at": rx.created_at.strftime("%B %d, %Y"),
+                "created_at": format_long_date(rx.created_at),
                 "diagnosis": rx.diagnosis,
                 "consultant_name": consultant.name if consultant else "Unknown",
                 "consultant_specialization": consultant_profile.specialization if consultant_profile else "",
-                "item_count": len(rx.items)
+                "item_count": rx.item_count
             })
         
         return {"success": True, "prescriptions": prescription_list}
     except Exception as e:
-        print(f"Error getting user prescriptions: {e}")
+        logger.exception("Error getting user prescriptions")
         return {"success": False, "error": str(e)}
 
 # ============================================================================
@@ -2805,7 +3110,7 @@ async def get_user_prescriptions(
 # ============================================================================
 
 @app.get("/prescriptions")
-async def prescriptions_page(request: Request, db: Session = Depends(get_db)):
+def prescriptions_page(request: Request, db: Session = Depends(get_db)):
     """Wellness Summary Reports page for users to view their wellness reports"""
     try:
         user_id = request.session.get("user_id")
@@ -2829,10 +3134,26 @@ async def prescriptions_page(request: Request, db: Session = Depends(get_db)):
             "active_page": "prescriptions"
         })
     except Exception as e:
-        print(f"Error loading prescriptions page: {e}")
+        logger.exception("Error loading prescriptions page")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def load_prescription_owners(db: Session, prescription_id: int):
+    """(user_id, consultant_id) of a prescription, or None if it doesn't exist"""
+    return db.query(Prescription.user_id, Prescription.consultant_id).filter(
+        Prescription.id == prescription_id
+    ).first()
+
+
+def load_prescription_pdf_data(db: Session, prescription_id: int) -> dict:
+    """Everything the PDF needs, as plain picklable data for the render workers"""
+    prescription = load_prescription(db, prescription_id)
+    prescription_data = format_prescription(prescription, load_prescription_items(db, prescription_id))
+    prescription_data["diagnosis"] = prescription.diagnosis or ""
+    prescription_data["notes"] = prescription.notes or ""
+    return prescription_data
+
+
 @app.get("/api/prescriptions/{prescription_id}/pdf")
 async def download_prescription_pdf(
     prescription_id: int,
@@ -2841,74 +3162,52 @@ async def download_prescription_pdf(
 ):
     """Generate and download prescription as PDF"""
     try:
-        from fastapi.responses import Response
-        from pdf_generator import generate_prescription_pdf
+        from pdf_generator import generate_prescription_pdf_async
         
         user_id = request.session.get("user_id")
         if not user_id:
             raise HTTPException(status_code=401, detail="Not authenticated")
         
-        # Get prescription with items
-        prescription = db.query(Prescription).filter(
-            Prescription.id == prescription_id
-        ).first()
+        # Only the owning columns are needed to authorize the download
+        owners = await run_in_threadpool(load_prescription_owners, db, prescription_id)
         
-        if not prescription:
+        if not owners:
             raise HTTPException(status_code=404, detail="Prescription not found")
         
         # Verify user is authorized (either the patient or the consultant)
-        if prescription.user_id != user_id and prescription.consultant_id != user_id:
+        if owners.user_id != user_id and owners.consultant_id != user_id:
             raise HTTPException(status_code=403, detail="Unauthorized")
         
-        # Get consultant info
-        consultant = db.query(User).filter(User.id == prescription.consultant_id).first()
-        consultant_profile = db.query(ConsultantProfile).filter(
-            ConsultantProfile.user_id == prescription.consultant_id
-        ).first()
-        
-        # Get patient info
-        patient = db.query(User).filter(User.id == prescription.user_id).first()
-        
-        # Format items
-        items = []
-        for item in prescription.items:
-            items.append({
-                "medication_name": item.medication_name,
-                "dosage": item.dosage,
-                "frequency": item.frequency,
-                "duration": item.duration,
-                "instructions": item.instructions
-            })
-        
-        # Prepare data for PDF
-        prescription_data = {
-            "id": prescription.id,
-            "created_at": prescription.created_at,
-            "diagnosis": prescription.diagnosis or "",
-            "notes": prescription.notes or "",
-            "consultant_name": consultant.name if consultant else "Unknown",
-            "consultant_specialization": consultant_profile.specialization if consultant_profile else "",
-            "patient_name": patient.name if patient else "Unknown",
-            "items": items
+        # Prescriptions are immutable once created, so the PDF never changes
+        etag = prescription_pdf_etag(prescription_id)
+        headers = {
+            "Content-Disposition": f"attachment; filename=prescription_{prescription_id}.pdf",
+            "ETag": etag,
+            "Cache-Control": "private, max-age=86400"
         }
-        
-        # Generate PDF
-        pdf_bytes = generate_prescription_pdf(prescription_data)
-        
-        # Return PDF as response
-        return Response(
-            content=pdf_bytes,
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        
+        cache_key = f"rxpdf:{prescription_id}"
+        pdf_bytes = await cache.aget(cache_key)
+        
+        if pdf_bytes is None:
+            prescription_data = await run_in_threadpool(load_prescription_pdf_data, db, prescription_id)
+            # Rendering is CPU-bound, so it runs in the PDF process pool
+            pdf_bytes = await generate_prescription_pdf_async(prescription_data)
+            await cache.aset(cache_key, pdf_bytes, PRESCRIPTION_PDF_CACHE_TTL)
+        
+        # Stream the PDF back in chunks rather than as a single body
+        headers["Content-Length"] = str(len(pdf_bytes))
+        return StreamingResponse(
+            iter_pdf_chunks(pdf_bytes),
             media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename=prescription_{prescription_id}.pdf"
-            }
+            headers=headers
         )
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error generating PDF: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error generating PDF")
         raise HTTPException(status_code=500, detail=f"Error generating PDF: {str(e)}")
 
 # ============================================================================
@@ -2916,7 +3215,7 @@ async def download_prescription_pdf(
 # ============================================================================
 
 @app.get("/recordings")
-async def recordings_page(request: Request, db: Session = Depends(get_db)):
+def recordings_page(request: Request, db: Session = Depends(get_db)):
     """Recordings page for users to listen to their call recordings"""
     try:
         user_id = request.session.get("user_id")
@@ -2939,34 +3238,35 @@ async def recordings_page(request: Request, db: Session = Depends(get_db)):
             "active_page": "recordings"
         })
     except Exception as e:
-        print(f"Error loading recordings page: {e}")
+        logger.exception("Error loading recordings page")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/user/recordings")
-async def get_user_recordings(request: Request, db: Session = Depends(get_db)):
+async def get_user_recordings(request: Request, db: AsyncSession = Depends(get_async_db)):
     """Get all recordings for the logged-in user"""
     try:
         user_id = request.session.get("user_id")
         if not user_id:
             raise HTTPException(status_code=401, detail="Not authenticated")
         
-        # Get all call sessions for this user
-        call_sessions = db.query(CallSession).filter(
-            CallSession.user_id == user_id,
-            CallSession.status == "completed",
-            CallSession.recording_url.isnot(None)
-        ).order_by(CallSession.actual_start.desc()).all()
+        # Get all call sessions for this user, with consultant and transcription
+        call_sessions = (await db.execute(
+            select(CallSession).options(
+                joinedload(CallSession.consultant),
+                joinedload(CallSession.transcription),
+                *STRICT_LOADING_OPTIONS
+            ).where(
+                CallSession.user_id == user_id,
+                CallSession.status == "completed",
+                CallSession.recording_url.isnot(None)
+            ).order_by(CallSession.actual_start.desc())
+        )).scalars().all()
         
         recordings = []
         for session in call_sessions:
-            # Get consultant info
-            consultant = db.query(User).filter(User.id == session.consultant_id).first()
-            
-            # Check if transcription exists
-            transcription = db.query(CallTranscription).filter(
-                CallTranscription.call_session_id == session.id
-            ).first()
+            consultant = session.consultant
+            transcription = session.transcription
             
             recordings.append({
                 "id": session.id,
@@ -2978,12 +3278,12 @@ async def get_user_recordings(request: Request, db: Session = Depends(get_db)):
         
         return {"success": True, "recordings": recordings}
     except Exception as e:
-        print(f"Error getting user recordings: {e}")
+        logger.exception("Error getting user recordings")
         return {"success": False, "error": str(e)}
 
 
 @app.get("/api/recordings/{session_id}")
-async def get_recording_details(
+def get_recording_details(
     session_id: int,
     request: Request,
     db: Session = Depends(get_db)
@@ -2994,8 +3294,12 @@ async def get_recording_details(
         if not user_id:
             raise HTTPException(status_code=401, detail="Not authenticated")
         
-        # Get call session
-        session = db.query(CallSession).filter(CallSession.id == session_id).first()
+        # Get call session with consultant and transcription in one query
+        session = db.query(CallSession).options(
+            joinedload(CallSession.consultant),
+            joinedload(CallSession.transcription),
+            *STRICT_LOADING_OPTIONS
+        ).filter(CallSession.id == session_id).first()
         
         if not session:
             return {"success": False, "error": "Recording not found"}
@@ -3004,17 +3308,12 @@ async def get_recording_details(
         if session.user_id != user_id and session.consultant_id != user_id:
             return {"success": False, "error": "Unauthorized"}
         
-        # Get consultant info
-        consultant = db.query(User).filter(User.id == session.consultant_id).first()
-        
-        # Get transcription if available
-        transcription = db.query(CallTranscription).filter(
-            CallTranscription.call_session_id == session.id
-        ).first()
+        consultant = session.consultant
+        transcription = session.transcription
         
         recording_data = {
             "id": session.id,
-            "call_date": session.actual_start.isoformat() if session.actual_start else session.scheduled_start.isoformat(),
+            "call_date": session.actual_start or session.scheduled_start,
             "duration_seconds": session.duration_seconds,
             "consultant_name": consultant.name if consultant else "Unknown",
             "status": session.status,
@@ -3027,37 +3326,29 @@ async def get_recording_details(
         
         return {"success": True, "recording": recording_data}
     except Exception as e:
-        print(f"Error getting recording details: {e}")
+        logger.exception("Error getting recording details")
         return {"success": False, "error": str(e)}
 
 
 @app.get("/api/consultant/patient/{patient_id}/recordings")
 async def get_patient_recordings(
     patient_id: int,
-    request: Request,
-    db: Session = Depends(get_db)
+    consultant: CurrentConsultant = Depends(require_consultant),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all recordings for a specific patient (consultant view)"""
     try:
-        user_id = request.session.get("user_id")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Not authenticated")
-        
-        # Verify user is a consultant
-        consultant_profile = db.query(ConsultantProfile).filter(
-            ConsultantProfile.user_id == user_id
-        ).first()
-        
-        if not consultant_profile:
-            return {"success": False, "error": "Unauthorized"}
+        user_id = consultant.user_id
         
         # Get all call sessions between this consultant and patient
-        call_sessions = db.query(CallSession).filter(
-            CallSession.user_id == patient_id,
-            CallSession.consultant_id == user_id,
-            CallSession.status == "completed",
-            CallSession.recording_url.isnot(None)
-        ).order_by(CallSession.actual_start.desc()).all()
+        call_sessions = (await db.execute(
+            select(CallSession).where(
+                CallSession.user_id == patient_id,
+                CallSession.consultant_id == user_id,
+                CallSession.status == "completed",
+                CallSession.recording_url.isnot(None)
+            ).order_by(CallSession.actual_start.desc())
+        )).scalars().all()
         
         recordings = []
         for session in call_sessions:
@@ -3069,59 +3360,57 @@ async def get_patient_recordings(
         
         return {"success": True, "recordings": recordings}
     except Exception as e:
-        print(f"Error getting patient recordings: {e}")
+        logger.exception("Error getting patient recordings")
         return {"success": False, "error": str(e)}
 
 
 @app.get("/api/consultant/patient/{patient_id}/summaries")
 async def get_patient_summaries(
     patient_id: int,
-    request: Request,
-    db: Session = Depends(get_db)
+    consultant: CurrentConsultant = Depends(require_consultant),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all call summaries for a specific patient"""
     try:
-        user_id = request.session.get("user_id")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Not authenticated")
-        
-        # Verify user is a consultant
-        consultant_profile = db.query(ConsultantProfile).filter(
-            ConsultantProfile.user_id == user_id
-        ).first()
-        
-        if not consultant_profile:
-            return {"success": False, "error": "Unauthorized"}
-        
-        # Get all call sessions with transcriptions
-        sessions = db.query(CallSession).filter(
-            CallSession.user_id == patient_id,
-            CallSession.consultant_id == user_id,
-            CallSession.status == "completed"
-        ).order_by(CallSession.actual_start.desc()).all()
-        
-        summaries = []
-        for session in sessions:
-            transcription = db.query(CallTranscription).filter(
-                CallTranscription.call_session_id == session.id
-            ).first()
-            
-            if transcription and transcription.summary:
-                summaries.append({
-                    "id": transcription.id,
-                    "date": session.actual_start.isoformat() if session.actual_start else session.scheduled_start.isoformat(),
-                    "summary": transcription.summary,
-                    "status": transcription.summary_status
-                })
+        user_id = consultant.user_id
+        
+        # Only completed calls that have a summary, joined and projected in SQL
+        rows = (await db.execute(
+            select(
+                CallTranscription.id,
+                CallSession.actual_start,
+                CallSession.scheduled_start,
+                CallTranscription.summary,
+                CallTranscription.summary_status
+            ).join(
+                CallSession, CallSession.id == CallTranscription.call_session_id
+            ).where(
+                CallSession.user_id == patient_id,
+                CallSession.consultant_id == user_id,
+                CallSession.status == "completed",
+                CallTranscription.summary.isnot(None)
+            ).order_by(CallSession.actual_start.desc())
+        )).all()
+        
+        summaries = [
+            {
+                "id": transcription_id,
+                "date": actual_start or scheduled_start,
+                "summary": summary,
+                "status": summary_status
+            }
+            for transcription_id, actual_start, scheduled_start, summary, summary_status in rows
+            if summary  # Empty summaries were skipped before as well
+        ]
         
         return {"success": True, "summaries": summaries}
     except Exception as e:
-        print(f"Error getting patient summaries: {e}")
+        logger.exception("Error getting patient summaries")
         return {"success": False, "error": str(e)}
 
 
 @app.get("/consultant/patient/{patient_id}")
-async def consultant_patient_detail(
+def consultant_patient_detail(
     patient_id: int,
     request: Request,
     db: Session = Depends(get_db)
@@ -3157,220 +3446,291 @@ async def consultant_patient_detail(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error loading patient detail page: {e}")
+        logger.exception("Error loading patient detail page")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ============================================================================
 # CONSULTANT NOTES API
 # ============================================================================
 
+NOTES_PAGE_SIZE = 50
+NOTES_MAX_PAGE_SIZE = 200
+# The first page is what a consultant sees on every tab switch, so its response body is
+# cached and dropped whenever a note or appointment note for the pair changes. Only with
+# Redis (shared_cache): the page reloads right after a write, possibly on another worker
+PATIENT_NOTES_CACHE_TTL = 300
+
+def patient_notes_cache_key(consultant_user_id: int, patient_id: int) -> str:
+    """Cache key for the first page of a consultant's notes on a patient"""
+    return f"notes:{consultant_user_id}:{patient_id}"
+
+def notes_cursor(epoch: int, note_type: str, note_id: int) -> str:
+    """Opaque pagination cursor for the last note of a page"""
+    return f"{epoch}:{note_type}:{note_id}"
+
+def parse_notes_cursor(cursor: str) -> Tuple[int, str, int]:
+    """Split a notes cursor into (epoch, type, id); raises 422 if it is malformed"""
+    try:
+        epoch, note_type, note_id = cursor.split(":")
+        return int(epoch), note_type, int(note_id)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+
+def notes_after_cursor(epoch_column, id_column, note_type: str, cursor: Tuple[int, str, int]):
+    """
+    Condition for notes of one type that sort after the cursor, newest first by
+    (epoch, type, id). The type is constant per query branch, so it is compared here
+    """
+    before_epoch, before_type, before_id = cursor
+    if note_type < before_type:
+        return epoch_column <= before_epoch
+    if note_type > before_type:
+        return epoch_column < before_epoch
+    return tuple_(epoch_column, id_column) < tuple_(before_epoch, before_id)
+
+
 @app.get("/api/consultant/patient/{patient_id}/notes")
 async def get_patient_notes(
     patient_id: int,
     request: Request,
-    db: Session = Depends(get_db)
+    before: Optional[str] = None,
+    limit: int = Query(NOTES_PAGE_SIZE, ge=1, le=NOTES_MAX_PAGE_SIZE)
 ):
-    """Get all notes for a specific patient including appointment notes"""
-    try:
-        user_id = request.session.get("user_id")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Not authenticated")
-        
-        # Verify user is a consultant
-        consultant_profile = db.query(ConsultantProfile).filter(
-            ConsultantProfile.user_id == user_id
-        ).first()
-        
-        if not consultant_profile:
-            return {"success": False, "error": "Unauthorized"}
-        
-        # 1. Get standalone PatientNotes
-        patient_notes = db.query(PatientNote).filter(
-            PatientNote.patient_id == patient_id,
-            PatientNote.consultant_id == user_id
-        ).all()
-        
-        # 2. Get notes from Appointments
-        appointment_notes = db.query(Appointment).filter(
-            Appointment.user_id == patient_id,
-            Appointment.consultant_id == consultant_profile.id,
-            Appointment.notes.isnot(None),
-            Appointment.notes != ""
-        ).all()
-        
-        notes_list = []
-        
-        # Add patient notes
-        for note in patient_notes:
-            notes_list.append({
-                "id": note.id,
-                "type": "general",
-                "content": note.content,
-                "created_at": note.created_at.isoformat(),
-                "timestamp": note.created_at.timestamp()
-            })
-            
-        # Add appointment notes
-        for appt in appointment_notes:
-            notes_list.append({
-                "id": f"appt_{appt.id}",
-                "type": "appointment",
-                "content": f"Consultation Note: {appt.notes}",
-                "created_at": appt.appointment_date.isoformat(),
-                "timestamp": appt.appointment_date.timestamp()
-            })
-            
-        # Sort by date descending
-        notes_list.sort(key=lambda x: x["timestamp"], reverse=True)
-        
-        return {"success": True, "notes": notes_list}
-    except Exception as e:
-        print(f"Error getting patient notes: {e}")
-        return {"success": False, "error": str(e)}
+    """Get a page of notes for a specific patient including appointment notes, newest first"""
+    user_id = request.session.get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    cache_key = patient_notes_cache_key(user_id, patient_id)
+    is_first_page = before is None and limit == NOTES_PAGE_SIZE
+    if is_first_page:
+        # Only ever stored after the consultant check passed for this user
+        cached_body = await shared_cache.aget(cache_key)
+        if cached_body is not None:
+            return Response(cached_body, media_type="application/json")
+    
+    # Verify user is a consultant (runs alongside the notes query below)
+    consultant_profile_id = select(ConsultantProfile.id).where(ConsultantProfile.user_id == user_id)
+    
+    # Standalone PatientNotes and appointment notes, merged and ordered in SQL
+    general_notes = select(
+        PatientNote.id.label("id"),
+        literal("general").label("type"),
+        PatientNote.content.label("content"),
+        PatientNote.created_at.label("created_at"),
+        PatientNote.created_at_epoch.label("created_at_epoch")
+    ).where(
+        PatientNote.patient_id == patient_id,
+        PatientNote.consultant_id == user_id
+    )
+    appointment_notes = select(
+        Appointment.id,
+        literal("appointment"),
+        literal("Consultation Note: ") + Appointment.notes,
+        Appointment.appointment_date,
+        Appointment.appointment_date_epoch
+    ).where(
+        Appointment.user_id == patient_id,
+        Appointment.consultant_id == consultant_profile_id.scalar_subquery(),
+        Appointment.notes.isnot(None),
+        Appointment.notes != ""
+    )
+    if before is not None:
+        # Keyset pagination: continue strictly after the last note already shown. The
+        # cursor carries type and id as well, so notes sharing a timestamp (same slot,
+        # or SQLite's one-second CURRENT_TIMESTAMP) are neither skipped nor repeated
+        cursor = parse_notes_cursor(before)
+        general_notes = general_notes.where(
+            notes_after_cursor(PatientNote.created_at_epoch, PatientNote.id, "general", cursor)
+        )
+        appointment_notes = appointment_notes.where(
+            notes_after_cursor(Appointment.appointment_date_epoch, Appointment.id, "appointment", cursor)
+        )
+    
+    # Independent queries, so run them concurrently on separate pooled sessions
+    consultant_rows, rows = await asyncio.gather(
+        fetch_all(consultant_profile_id),
+        fetch_all(
+            union_all(general_notes, appointment_notes)
+            .order_by(desc("created_at_epoch"), desc("type"), desc("id"))
+            .limit(limit)
+        )
+    )
+    if not consultant_rows:
+        return {"success": False, "error": "Unauthorized"}
+    
+    notes_list = [
+        {
+            "id": note_id if note_type == "general" else f"appt_{note_id}",
+            "type": note_type,
+            "content": content,
+            # orjson writes datetimes natively; the epoch comes precomputed from the database
+            "created_at": created_at,
+            "timestamp": created_at_epoch
+        }
+        for note_id, note_type, content, created_at, created_at_epoch in rows
+    ]
+    next_cursor = None
+    if len(rows) == limit:
+        last_id, last_type, _, _, last_epoch = rows[-1]
+        next_cursor = notes_cursor(last_epoch, last_type, last_id)
+    
+    # Returned as a response directly so FastAPI skips its jsonable_encoder pass over every note
+    response = ORJSONResponse({"success": True, "notes": notes_list, "next_cursor": next_cursor})
+    if is_first_page:
+        await shared_cache.aset(cache_key, response.body, PATIENT_NOTES_CACHE_TTL)
+    return response
 
 
 @app.post("/api/consultant/patient/{patient_id}/notes")
 async def add_patient_note(
     patient_id: int,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Add a new note for a patient"""
-    try:
-        user_id = request.session.get("user_id")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Not authenticated")
-        
-        # Verify user is a consultant
-        consultant_profile = db.query(ConsultantProfile).filter(
-            ConsultantProfile.user_id == user_id
-        ).first()
-        
-        if not consultant_profile:
-            return {"success": False, "error": "Unauthorized"}
-        
-        # Get request body
-        body = await request.json()
-        content = body.get("content", "").strip()
-        
-        if not content:
-            return {"success": False, "error": "Note content is required"}
-        
-        # Create new note
-        note = PatientNote(
+    user_id = request.session.get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    # Verify user is a consultant
+    consultant_profile = (await db.execute(
+        select(ConsultantProfile).where(ConsultantProfile.user_id == user_id)
+    )).scalar_one_or_none()
+    
+    if not consultant_profile:
+        return {"success": False, "error": "Unauthorized"}
+    
+    # Get request body
+    body = await request.json()
+    content = body.get("content", "").strip()
+    
+    if not content:
+        return {"success": False, "error": "Note content is required"}
+    
+    # Create new note; RETURNING hands back the generated columns in the same round-trip
+    note = (await db.execute(
+        insert(PatientNote).values(
             patient_id=patient_id,
             consultant_id=user_id,
             content=content
-        )
-        
-        db.add(note)
-        db.commit()
-        db.refresh(note)
-        
-        return {
-            "success": True,
-            "note": {
-                "id": note.id,
-                "content": note.content,
-                "created_at": note.created_at.isoformat()
-            }
-        }
-    except Exception as e:
-        print(f"Error adding patient note: {e}")
-        db.rollback()
-        return {"success": False, "error": str(e)}
+        ).returning(PatientNote.id, PatientNote.content, PatientNote.created_at)
+    )).one()
+    await db.commit()
+    await shared_cache.adelete(patient_notes_cache_key(user_id, patient_id))
+    
+    return ORJSONResponse({"success": True, "note": dict(note._mapping)})
 
 
 @app.delete("/api/consultant/notes/{note_id}")
 async def delete_patient_note(
     note_id: int,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a patient note"""
-    try:
-        user_id = request.session.get("user_id")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Not authenticated")
-        
-        # Get the note
-        note = db.query(PatientNote).filter(PatientNote.id == note_id).first()
-        
-        if not note:
-            return {"success": False, "error": "Note not found"}
-        
-        # Verify the note belongs to this consultant
-        if note.consultant_id != user_id:
-            return {"success": False, "error": "Unauthorized"}
-        
-        db.delete(note)
-        db.commit()
-        
-        return {"success": True}
-    except Exception as e:
-        print(f"Error deleting patient note: {e}")
-        db.rollback()
-        return {"success": False, "error": str(e)}
+    user_id = request.session.get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    # Delete only if the note belongs to this consultant, checked atomically by the
+    # DELETE itself. Someone else's note looks the same as a missing one.
+    patient_id = (await db.execute(
+        delete(PatientNote).where(
+            PatientNote.id == note_id,
+            PatientNote.consultant_id == user_id
+        ).returning(PatientNote.patient_id)
+    )).scalar_one_or_none()
+    
+    if patient_id is None:
+        return {"success": False, "error": "Note not found"}
+    
+    await db.commit()
+    await shared_cache.adelete(patient_notes_cache_key(user_id, patient_id))
+    
+    return {"success": True}
 
 # ============================================================================
 # ADMIN ROUTES
 # ============================================================================
 
+ADMIN_LISTING_CACHE_TTL = 60
+ADMIN_USERS_CACHE_KEY = "admin:users:list"
+ADMIN_CONSULTANTS_CACHE_KEY = "admin:consultants:list"
+USER_TYPE_CACHE_TTL = 300
+
+def user_type_cache_key(user_id: int) -> str:
+    """Cache key for a user's role"""
+    return f"user_type:{user_id}"
+
+async def require_admin(request: Request, db: AsyncSession = Depends(get_async_db)) -> int:
+    """Dependency for admin API endpoints; returns the admin's user id or raises 401/403"""
+    admin_id = request.session.get("user_id")
+    if not admin_id:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    cache_key = user_type_cache_key(admin_id)
+    user_type = await shared_cache.aget_json(cache_key)
+    if user_type is None:
+        user_type = (await db.execute(
+            select(User.user_type).where(User.id == admin_id)
+        )).scalar_one_or_none()
+        if user_type is not None:
+            await shared_cache.aset_json(cache_key, user_type, USER_TYPE_CACHE_TTL)
+    
+    if user_type != "admin":
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    return admin_id
+
 @app.get("/admin", response_class=HTMLResponse)
-async def admin_dashboard(request: Request, db: Session = Depends(get_db)):
+async def admin_dashboard(request: Request, db: AsyncSession = Depends(get_async_db)):
     """Admin dashboard to manage users and consultants"""
     user_id = request.session.get("user_id")
     # Redirect to login if not authenticated
     if not user_id:
         return RedirectResponse(url="/")
     
-    current_user = db.query(User).filter(User.id == user_id).first()
+    current_user = await db.get(User, user_id)
     
     # Strictly check for admin type
     if not current_user or current_user.user_type != "admin":
          # Return forbidden or redirect
          return RedirectResponse(url="/app")
          
-    # Fetch all users
-    users = db.query(User).filter(User.user_type == "user").all()
-    # Fetch all consultants (joining with profile)
-    consultants_query = db.query(User).filter(User.user_type == "consultant").all()
-    
-    # Process for template
-    processed_users = []
-    for u in users:
-        processed_users.append({
-            "id": u.id,
-            "name": u.name,
-            "email": u.email,
-            "initials": get_initials(u.name),
-            "created_at": u.created_at,
-            "is_active": u.is_active,
-            "user_type": u.user_type
-        })
-        
-    processed_consultants = []
-    for c in consultants_query:
-        # Access consultant profile via backref/relationship if it exists
-        profile = None
-        # Handle cases where backref might return list or object depending on exact SQLA version/config
-        if hasattr(c, "consultant_profile"):
-            cp = c.consultant_profile
-            if isinstance(cp, list) and cp:
-                profile = cp[0]
-            elif cp and not isinstance(cp, list):
-                profile = cp
-        
-        processed_consultants.append({
-            "id": c.id, # User ID
-            "name": c.name,
-            "email": c.email,
-            "initials": get_initials(c.name),
-            "is_active": c.is_active,
-            "specialization": profile.specialization if profile else "Not Setup",
-            "hourly_rate": profile.hourly_rate if profile else 0,
-            "user_type": c.user_type
-        })
+    # Listings only read columns, so select plain rows instead of hydrating ORM objects
+    async def load_users():
+        user_rows = await fetch_all(
+            select(User.id, User.name, User.initials, User.email, User.is_active, User.user_type, User.created_at)
+            .where(User.user_type == "user")
+        )
+        users = []
+        for row in user_rows:
+            user = dict(row._mapping)
+            # Rows written before the initials column existed may not have it yet
+            user["initials"] = row.initials or get_initials(row.name)
+            user["joined_on"] = user.pop("created_at").strftime("%Y-%m-%d")
+            users.append(user)
+        return users
+    
+    async def load_consultants():
+        # Consultants already joined with their profiles by the admin_consultants_mv view
+        consultant_rows = await fetch_all(select(*AdminConsultantView.__table__.columns))
+        return [
+            {
+                **row._mapping, # id is the User ID
+                "initials": row.initials or get_initials(row.name),
+                "specialization": row.specialization or "Not Setup",
+                "hourly_rate": row.hourly_rate or 0
+            }
+            for row in consultant_rows
+        ]
+    
+    # Listings are cached already processed, so repeat views skip the queries entirely.
+    # On a miss the two loaders query concurrently on their own sessions.
+    processed_users, processed_consultants = await asyncio.gather(
+        cache.amemoize(ADMIN_USERS_CACHE_KEY, load_users, ADMIN_LISTING_CACHE_TTL),
+        cache.amemoize(ADMIN_CONSULTANTS_CACHE_KEY, load_consultants, ADMIN_LISTING_CACHE_TTL)
+    )
         
     return templates.TemplateResponse(
         "pages/admin_dashboard.html",
@@ -3380,32 +3740,34 @@ async def admin_dashboard(request: Request, db: Session = Depends(get_db)):
             "users": processed_users,
             "consultants": processed_consultants,
             "user_name": current_user.name,
-            "user_initials": get_initials(current_user.name),
+            "user_initials": current_user.initials or get_initials(current_user.name),
             "user_type": current_user.user_type,
             "active_page": "dashboard"
         }
     )
 
 @app.post("/api/admin/users/{user_id}/status")
-async def update_user_status(user_id: int, request: Request, db: Session = Depends(get_db)):
-    # Auth check
-    admin_id = request.session.get("user_id")
-    if not admin_id: return {"success": False, "error": "Unauthorized"}
-    admin = db.query(User).filter(User.id == admin_id).first()
-    if not admin or admin.user_type != "admin": return {"success": False, "error": "Unauthorized"}
-    
+async def update_user_status(
+    user_id: int,
+    request: Request,
+    admin_id: int = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
     data = await request.json()
     is_active = data.get("is_active")
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user: return {"success": False, "error": "User not found"}
     
     user.is_active = is_active
-    db.commit()
+    await db.commit()
+    if user.user_type == "consultant":
+        await arefresh_admin_consultants_view(db)
+    await shared_cache.adelete(user_type_cache_key(user_id))
+    await cache.adelete(ADMIN_USERS_CACHE_KEY, ADMIN_CONSULTANTS_CACHE_KEY)
     
     # Audit Log
-    AuditLogger.log_event(
-        db, 
+    AuditLogger.enqueue_event(
         event_type="admin_update_status", 
         user_id=admin_id,
         resource_type="user",
@@ -3417,22 +3779,25 @@ async def update_user_status(user_id: int, request: Request, db: Session = Depen
     return {"success": True}
 
 @app.delete("/api/admin/users/{user_id}")
-async def delete_user_admin(user_id: int, request: Request, db: Session = Depends(get_db)):
-    # Auth check
-    admin_id = request.session.get("user_id")
-    if not admin_id: return {"success": False, "error": "Unauthorized"}
-    admin = db.query(User).filter(User.id == admin_id).first()
-    if not admin or admin.user_type != "admin": return {"success": False, "error": "Unauthorized"}
-    
-    user = db.query(User).filter(User.id == user_id).first()
+async def delete_user_admin(
+    user_id: int,
+    request: Request,
+    admin_id: int = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    user = await db.get(User, user_id)
     if not user: return {"success": False, "error": "User not found"}
     
-    db.delete(user) 
-    db.commit()
+    is_consultant = user.user_type == "consultant"
+    await db.delete(user)
+    await db.commit()
+    if is_consultant:
+        await arefresh_admin_consultants_view(db)
+    await shared_cache.adelete(consultant_cache_key(user_id), user_type_cache_key(user_id))
+    await cache.adelete(ADMIN_USERS_CACHE_KEY, ADMIN_CONSULTANTS_CACHE_KEY)
     
     # Audit Log
-    AuditLogger.log_event(
-        db, 
+    AuditLogger.enqueue_event(
         event_type="admin_delete_user", 
         user_id=admin_id,
         resource_type="user",
@@ -3444,35 +3809,35 @@ async def delete_user_admin(user_id: int, request: Request, db: Session = Depend
     return {"success": True}
 
 @app.post("/api/admin/consultants/{user_id}/price")
-async def update_consultant_price(user_id: int, request: Request, db: Session = Depends(get_db)):
-    # Auth check
-    admin_id = request.session.get("user_id")
-    if not admin_id: return {"success": False, "error": "Unauthorized"}
-    admin = db.query(User).filter(User.id == admin_id).first()
-    if not admin or admin.user_type != "admin": return {"success": False, "error": "Unauthorized"}
-    
+async def update_consultant_price(
+    user_id: int,
+    request: Request,
+    admin_id: int = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
     data = await request.json()
     hourly_rate = data.get("hourly_rate")
     
-    # Look for profile
-    profile = db.query(ConsultantProfile).filter(ConsultantProfile.user_id == user_id).first()
-    
-    if not profile:
-        # Create profile if it doesn't exist (edge case)
-        profile = ConsultantProfile(user_id=user_id, hourly_rate=float(hourly_rate))
-        db.add(profile)
-    else:
-        profile.hourly_rate = float(hourly_rate)
-        
-    db.commit()
+    # Update the profile's rate, creating the profile if it doesn't exist (edge case),
+    # in one atomic statement keyed on the unique user_id
+    upsert = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+    stmt = upsert(ConsultantProfile).values(user_id=user_id, hourly_rate=float(hourly_rate))
+    profile_id = (await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[ConsultantProfile.user_id],
+            set_={"hourly_rate": stmt.excluded.hourly_rate}
+        ).returning(ConsultantProfile.id)
+    )).scalar_one()
+    await db.commit()
+    await arefresh_admin_consultants_view(db)
+    await cache.adelete(ADMIN_CONSULTANTS_CACHE_KEY)
     
     # Audit Log
-    AuditLogger.log_event(
-        db, 
+    AuditLogger.enqueue_event(
         event_type="admin_update_price", 
         user_id=admin_id,
         resource_type="consultant_profile",
-        resource_id=str(profile.id),
+        resource_id=str(profile_id),
         details=f"Set hourly rate to {hourly_rate}",
         request=request
     )
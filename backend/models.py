@@ -1,14 +1,73 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, Boolean, ForeignKey, Text
+from sqlalchemy import create_engine, event, Column, Integer, BigInteger, String, DateTime, Float, Boolean, ForeignKey, Text, Index, Computed, select
 from sqlalchemy.sql import func
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, backref, column_property
 from datetime import datetime
 import bcrypt
+import asyncio
+import os
 
 # Create base class for models
 Base = declarative_base()
 
 
+class unix_epoch(FunctionElement):
+    """Whole seconds since the Unix epoch for a UTC timestamp column, for generated sort keys"""
+    type = BigInteger()
+    inherit_cache = True
+
+
+@compiles(unix_epoch, "postgresql")
+def _unix_epoch_postgresql(element, compiler, **kw):
+    column = list(element.clauses)[0]
+    value = compiler.process(column, **kw)
+    # Generated columns need an immutable expression; EXTRACT on timestamptz is
+    # only stable, so convert it to a plain UTC timestamp first
+    if getattr(column.type, "timezone", False):
+        value = f"({value} AT TIME ZONE 'UTC')"
+    return f"CAST(EXTRACT(EPOCH FROM {value}) AS BIGINT)"
+
+
+@compiles(unix_epoch, "sqlite")
+def _unix_epoch_sqlite(element, compiler, **kw):
+    return f"CAST(strftime('%s', {compiler.process(element.clauses, **kw)}) AS INTEGER)"
+
+
+# bcrypt work factor; each +1 doubles hashing time. Existing hashes keep
+# verifying at whatever cost they were created with.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+
+def hash_password(password: str) -> str:
+    """Hash a password with bcrypt"""
+    # Truncate password to 72 bytes to comply with bcrypt limitations
+    password_bytes = password.encode('utf-8')[:72]
+    # Generate salt and hash the password
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    # Store as string
+    return bcrypt.hashpw(password_bytes, salt).decode('utf-8')
+
+
+def make_initials(name: str) -> str:
+    """Generate initials from a name"""
+    name_parts = name.split()
+    if len(name_parts) >= 2:
+        return f"{name_parts[0][0]}{name_parts[-1][0]}".upper()
+    elif len(name_parts) == 1:
+        return name_parts[0][:2].upper()
+    else:
+        return "U"
+
+
+def check_password(password: str, password_hash: str) -> bool:
+    """Check a password against a bcrypt hash"""
+    # Truncate password to 72 bytes to comply with bcrypt limitations
+    password_bytes = password.encode('utf-8')[:72]
+    return bcrypt.checkpw(password_bytes, password_hash.encode('utf-8'))
+
+
 class User(Base):
     """User model for authentication and profile data"""
     __tablename__ = "users"
@@ -16,6 +75,7 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), unique=True, index=True, nullable=False)
     name = Column(String(255), nullable=False)
+    initials = Column(String(8), nullable=True)  # Derived from name on write, see set_user_initials
     password_hash = Column(String(255), nullable=False)
     user_type = Column(String(50), nullable=False, default="user")  # 'user' or 'consultant'
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -45,29 +105,40 @@ class User(Base):
         cascade="all, delete-orphan"
     )
     
+    __table_args__ = (
+        # Consultant listings and role checks only ever filter on this one value
+        Index("ix_users_consultant_partial", user_type, postgresql_where=user_type == "consultant"),
+    )
+    
     def set_password(self, password: str):
         """Hash and set the user's password"""
-        # Truncate password to 72 bytes to comply with bcrypt limitations
-        password_bytes = password.encode('utf-8')[:72]
-        # Generate salt and hash the password
-        salt = bcrypt.gensalt()
-        hashed = bcrypt.hashpw(password_bytes, salt)
-        # Store as string
-        self.password_hash = hashed.decode('utf-8')
+        self.password_hash = hash_password(password)
     
     def verify_password(self, password: str) -> bool:
         """Verify a password against the hash"""
-        # Truncate password to 72 bytes to comply with bcrypt limitations
-        password_bytes = password.encode('utf-8')[:72]
-        # Compare with stored hash
-        hash_bytes = self.password_hash.encode('utf-8')
-        return bcrypt.checkpw(password_bytes, hash_bytes)
+        return check_password(password, self.password_hash)
+    
+    async def set_password_async(self, password: str):
+        """set_password with the hashing done in a worker thread, for async handlers"""
+        self.password_hash = await asyncio.to_thread(hash_password, password)
+    
+    async def verify_password_async(self, password: str) -> bool:
+        """verify_password with the hashing done in a worker thread, for async handlers"""
+        return await asyncio.to_thread(check_password, password, self.password_hash)
     
     def update_last_login(self):
         """Update the last login timestamp"""
         self.last_login = datetime.utcnow()
 
 
+@event.listens_for(User, "before_insert")
+@event.listens_for(User, "before_update")
+def set_user_initials(mapper, connection, target):
+    """Keep User.initials in step with the name, so listings don't recompute it per request"""
+    if target.name:
+        target.initials = make_initials(target.name)
+
+
 class OTPVerification(Base):
     """OTP verification store"""
     __tablename__ = "otp_verification"
@@ -78,6 +149,11 @@ class OTPVerification(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     expires_at = Column(DateTime, nullable=False)
     is_verified = Column(Boolean, default=False)
+    
+    __table_args__ = (
+        # Lookups only care about OTPs still waiting to be verified
+        Index("ix_otp_live", phone_number, postgresql_where=is_verified == False),
+    )
 
 
 class PasswordResetToken(Base):
@@ -93,6 +169,11 @@ class PasswordResetToken(Base):
     
     # Relationship
     user = relationship("User", back_populates="reset_tokens")
+    
+    __table_args__ = (
+        # Token checks always filter on used = false
+        Index("ix_reset_live", token, postgresql_where=used == False),
+    )
 
 
 class VitalsRecord(Base):
@@ -119,6 +200,11 @@ class VitalsRecord(Base):
     
     # Relationship
     user = relationship("User", back_populates="vitals_records")
+    
+    # Latest-readings lookups: WHERE user_id = ? ORDER BY timestamp DESC LIMIT n
+    __table_args__ = (
+        Index("ix_vitals_user_ts", user_id, timestamp.desc()),
+    )
 
 
 class MoodEntry(Base):
@@ -133,6 +219,10 @@ class MoodEntry(Base):
     
     # Relationship
     user = relationship("User", back_populates="mood_entries")
+    
+    __table_args__ = (
+        Index("ix_mood_user_ts", user_id, timestamp.desc()),
+    )
 
 
 class ConsultantInteraction(Base):
@@ -182,8 +272,8 @@ class UserProfile(Base):
     # Metadata
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # Relationship
-    user = relationship("User", backref="profile")
+    # Relationship (user_id is unique, so each user has at most one profile)
+    user = relationship("User", backref=backref("profile", uselist=False))
 
 
 class ConsultantProfile(Base):
@@ -208,8 +298,8 @@ class ConsultantProfile(Base):
     contact_details = Column(Text, nullable=True)  # JSON: address, phone, email
     education = Column(Text, nullable=True)  # Education details
     
-    # Relationship
-    user = relationship("User", backref="consultant_profile")
+    # Relationship (user_id is unique, so each user has at most one consultant profile)
+    user = relationship("User", backref=backref("consultant_profile", uselist=False))
     schedules = relationship("ConsultantSchedule", back_populates="consultant", cascade="all, delete-orphan")
     appointments = relationship("Appointment", back_populates="consultant", cascade="all, delete-orphan")
 
@@ -237,6 +327,7 @@ class Appointment(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     consultant_id = Column(Integer, ForeignKey("consultant_profiles.id"), nullable=False)
     appointment_date = Column(DateTime, nullable=False)
+    appointment_date_epoch = Column(BigInteger, Computed(unix_epoch(appointment_date), persisted=True))
     duration_minutes = Column(Integer, default=60)
     status = Column(String(50), default="scheduled")  # scheduled, completed, cancelled
     notes = Column(Text, nullable=True)
@@ -245,6 +336,11 @@ class Appointment(Base):
     # Relationships
     user = relationship("User", backref="appointments")
     consultant = relationship("ConsultantProfile", back_populates="appointments")
+    
+    __table_args__ = (
+        Index("ix_appointments_consultant_user", consultant_id, user_id),
+        Index("ix_appointments_user_consultant_date", user_id, consultant_id, appointment_date.desc()),
+    )
 
 
 class Message(Base):
@@ -312,6 +408,10 @@ class CallSession(Base):
     user = relationship("User", foreign_keys=[user_id], backref="user_call_sessions")
     consultant = relationship("User", foreign_keys=[consultant_id], backref="consultant_call_sessions")
     transcription = relationship("CallTranscription", back_populates="call_session", uselist=False, cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        Index("ix_call_user_actual", user_id, actual_start.desc()),
+    )
 
 
 class CallTranscription(Base):
@@ -393,6 +493,10 @@ class Prescription(Base):
     appointment = relationship("Appointment", backref="prescription")
     items = relationship("PrescriptionItem", back_populates="prescription", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_rx_user_created", user_id, created_at.desc()),
+    )
+
 
 class PrescriptionItem(Base):
     """Individual medication items in a prescription"""
@@ -410,6 +514,17 @@ class PrescriptionItem(Base):
     prescription = relationship("Prescription", back_populates="items")
 
 
+# Number of items per prescription, computed in SQL so list views don't have to
+# load every item just to count them. Deferred; opt in with undefer().
+Prescription.item_count = column_property(
+    select(func.count(PrescriptionItem.id))
+    .where(PrescriptionItem.prescription_id == Prescription.id)
+    .correlate_except(PrescriptionItem)
+    .scalar_subquery(),
+    deferred=True
+)
+
+
 class PatientNote(Base):
     __tablename__ = "patient_notes"
     
@@ -418,8 +533,42 @@ class PatientNote(Base):
     consultant_id = Column(Integer, ForeignKey("users.id"))
     content = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at_epoch = Column(BigInteger, Computed(unix_epoch(created_at), persisted=True))
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationships
     patient = relationship("User", foreign_keys=[patient_id], backref="notes")
     consultant = relationship("User", foreign_keys=[consultant_id], backref="authored_notes")
+    
+    __table_args__ = (
+        Index("ix_patient_notes_patient_consultant_created", patient_id, consultant_id, created_at.desc()),
+    )
+
+
+# ============================================================================
+# READ-ONLY VIEWS
+# ============================================================================
+
+# Consultant listing for the admin dashboard, pre-joined with the profile.
+# A materialized view on PostgreSQL (refreshed on writes), a plain view on SQLite.
+ADMIN_CONSULTANTS_VIEW_QUERY = (
+    "SELECT u.id, u.name, u.initials, u.email, u.is_active, u.user_type, cp.specialization, cp.hourly_rate "
+    "FROM users u LEFT JOIN consultant_profiles cp ON cp.user_id = u.id "
+    "WHERE u.user_type = 'consultant'"
+)
+
+
+class AdminConsultantView(Base):
+    """Read-only mapping of the admin_consultants_mv view; never written through the ORM"""
+    __tablename__ = "admin_consultants_mv"
+    # Skipped by create_all() and Alembic autogenerate; created by create_views()
+    __table_args__ = {"info": {"is_view": True}}
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(255))
+    initials = Column(String(8))
+    email = Column(String(255))
+    is_active = Column(Boolean)
+    user_type = Column(String(50))
+    specialization = Column(String(255))
+    hourly_rate = Column(Float)
@@ -2,17 +2,153 @@
 Ollama AI Chat Integration
 Provides AI-powered chat support for users
 """
+import asyncio
 import requests
-import json
-from typing import List, Dict
-from datetime import datetime
+import httpx
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib.parse import urlsplit
+import orjson
+import re
+import socket
+import time
+import hashlib
+from functools import lru_cache
+from typing import AsyncIterator, List, Dict
+import logging
+from logging.handlers import RotatingFileHandler
 from simple_bot import simple_bot
+from logging_utils import get_queue_logger
+from response_cache import response_cache
+from chat_memory import FACT_EXTRACTION_PROMPT, facts_message, fit_to_budget, parse_facts
+
+# (connect, read) timeouts in seconds: fail fast if Ollama isn't reachable,
+# but give slower models time to generate
+TAGS_TIMEOUT = (2, 2)
+# Quick TCP check before probing over HTTP, so startup isn't held up by the
+# request timeout and retries when nothing is listening
+PORT_CHECK_TIMEOUT = 0.1
+CHAT_TIMEOUT = (3, 60)
+# Request bodies are serialized with orjson, so the content type is set by hand
+JSON_HEADERS = {"Content-Type": "application/json"}
+# Model families to prefer, best first - smaller/faster models first for responsiveness.
+# A model belongs to the first family its name starts with.
+MODEL_PRIORITIES = ['llama3.2', 'mistral', 'llama3.1', 'llama3', 'llama2']
+MODEL_PRIORITY_RE = re.compile("^(%s)" % "|".join(re.escape(p) for p in MODEL_PRIORITIES))
+MODEL_PRIORITY_RANK = {p: rank for rank, p in enumerate(MODEL_PRIORITIES)}
+# The installed models rarely change, so re-probe /api/tags at most this often
+MODEL_CACHE_TTL = 60
+# Shared by all async chats. Ollama only answers requests in parallel when started
+# with OLLAMA_NUM_PARALLEL > 1, otherwise it queues them.
+ASYNC_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+ASYNC_TIMEOUT = httpx.Timeout(60, connect=3)
+# Async chats are collected for up to BATCH_WINDOW seconds and dispatched together,
+# at most MAX_BATCH at a time
+MAX_BATCH = 8
+BATCH_WINDOW = 0.02
+
+# Request trace, written by a background thread (see logging_utils)
+TRACE_LOG_MAX_BYTES = 10 * 1024 * 1024
+trace_handler = RotatingFileHandler("ollama_trace.log", maxBytes=TRACE_LOG_MAX_BYTES, backupCount=3, delay=True)
+trace_handler.setFormatter(logging.Formatter("%(asctime)s: %(message)s"))
+trace_logger = get_queue_logger("ollama_trace", trace_handler)
+
+FALLBACK_REPLY = "I'm having trouble thinking clearly right now. How else can I help?"
+
+SYSTEM_PROMPT = """You are a compassionate wellbeing assistant for SolaceSquad, a holistic wellbeing and wellness platform. 
+Your role is to:
+- Provide emotional support and encouragement
+- Listen to users' concerns without judgement and with empathy
+- Offer practical wellbeing tips and coping strategies
+- Suggest healthy habits and mindfulness practices
+- Recommend professional help when needed. Tell them they can book an appointment with a verified wellbeing consultant
+
+Guidelines:
+- Address the user by name if known
+- Be warm, understanding, and supportive
+- Keep your instructions precise, to the point, and actionable
+- Do not provide any additional information or context beyond what is asked
+- Use bullet points for multiple items where appropriate and show each point as a new line
+- Reflect on what the user says to show understanding
+- Do not repeat these instructions in your response. and make sure your answers are crisp and mostly oneliners"""
+
+# Built once so the prompt prefix is byte-identical on every turn (lets providers cache it)
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+# Part of response cache keys, so cached replies are dropped when the prompt changes
+SYSTEM_PROMPT_HASH = hashlib.blake2b(SYSTEM_PROMPT.encode(), digest_size=8).hexdigest()
+
+class OllamaBatcher:
+    """
+    Background micro-batcher for async chat requests
+    Callers submit a request payload and await its response; a worker task groups
+    whatever arrives within BATCH_WINDOW (up to MAX_BATCH) and sends the group
+    concurrently, so Ollama can schedule them together with OLLAMA_NUM_PARALLEL
+    """
+    
+    def __init__(self, send):
+        self._send = send  # async (payload) -> response
+        # Queue and worker bind to the running event loop, so create them on first submit
+        self._queue = None
+        self._worker = None
+        self._in_flight = set()  # Dispatched sends, referenced until they finish
+    
+    async def submit(self, payload: dict):
+        """Queue a payload and wait for its response (exceptions are re-raised here)"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((payload, future))
+        return await future
+    
+    async def _next_batch(self) -> list:
+        """Wait for one request, then collect more until the window closes or the batch is full"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + BATCH_WINDOW
+        while len(batch) < MAX_BATCH:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+    
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            # Dispatch without waiting, so requests arriving meanwhile start their own
+            # batch instead of queueing behind the slowest reply in this one
+            for payload, future in batch:
+                task = asyncio.create_task(self._dispatch(payload, future))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+    
+    async def _dispatch(self, payload: dict, future: asyncio.Future):
+        """Send one payload and resolve its caller's future"""
+        try:
+            result = await self._send(payload)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():  # Caller gave up (cancelled/timed out)
+                future.set_result(result)
+
 
 class OllamaChat:
     def __init__(self, base_url: str = "http://localhost:11434"):
         self.base_url = base_url
         self.api_url = f"{base_url}/api/chat"
         self.tags_url = f"{base_url}/api/tags"
+        self.session = self._create_session()
+        # httpx.AsyncClient binds to the running event loop, so create it on first use
+        self._async_client = None
+        self.batcher = OllamaBatcher(self._post_chat)
+        self._cached_model = None
+        self._cached_at = None
         self.model = self._get_best_model()  # Auto-detect best model
         self.use_ollama = bool(self.model)
         
@@ -21,28 +157,74 @@ class OllamaChat:
         else:
             print("[Ollama] Service unavailable or no models found. Using fallback bot.")
     
+    @staticmethod
+    def _create_session() -> requests.Session:
+        """HTTP session with pooled keep-alive connections, reused across chat turns"""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=20,
+            max_retries=Retry(total=2, backoff_factor=0.2)
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+    
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(limits=ASYNC_LIMITS, timeout=ASYNC_TIMEOUT)
+        return self._async_client
+    
+    async def _post_chat(self, payload: dict) -> httpx.Response:
+        return await self.async_client.post(self.api_url, content=orjson.dumps(payload), headers=JSON_HEADERS)
+    
     def _get_best_model(self) -> str:
+        """Best available model, probing Ollama at most once per MODEL_CACHE_TTL"""
+        if self._cached_at is None or time.monotonic() - self._cached_at > MODEL_CACHE_TTL:
+            self._cached_model = self._probe_best_model()
+            self._cached_at = time.monotonic()
+        return self._cached_model
+    
+    def refresh_model(self) -> bool:
+        """Re-detect the model now (e.g. after pulling one into Ollama); returns availability"""
+        self._cached_at = None
+        self.model = self._get_best_model()
+        self.use_ollama = bool(self.model)
+        return self.use_ollama
+    
+    def _is_listening(self) -> bool:
+        """Whether anything accepts connections on the Ollama host and port"""
+        address = urlsplit(self.base_url)
+        port = address.port or (443 if address.scheme == "https" else 80)
+        try:
+            with socket.create_connection((address.hostname, port), timeout=PORT_CHECK_TIMEOUT):
+                return True
+        except OSError:
+            return False
+    
+    def _probe_best_model(self) -> str:
         """
         Detect available models and pick the best one.
         """
+        if not self._is_listening():
+            return None
         try:
-            response = requests.get(self.tags_url, timeout=2)
+            response = self.session.get(self.tags_url, timeout=TAGS_TIMEOUT)
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 models = [m['name'] for m in data.get('models', [])]
                 
-                # Priority list - prefer smaller/faster models first for responsiveness
-                priorities = ['llama3.2', 'mistral', 'llama3.1', 'llama3', 'llama2']
-                
-                # Check for exact matches or partial matches
-                for p in priorities:
-                    # Check exact
-                    if f"{p}:latest" in models:
-                        return f"{p}:latest"
-                    # Check partial
-                    for m in models:
-                        if m.startswith(p):
-                            return m
+                # Rank every model in one pass: priority family first, then the
+                # family's :latest tag, then list order
+                ranked = []
+                for index, name in enumerate(models):
+                    match = MODEL_PRIORITY_RE.match(name)
+                    if match:
+                        family = match.group(1)
+                        ranked.append((MODEL_PRIORITY_RANK[family], name != f"{family}:latest", index, name))
+                if ranked:
+                    return min(ranked)[-1]
                 
                 # If no priority model found, take the first one
                 if models:
@@ -53,115 +235,209 @@ class OllamaChat:
             print(f"Error checking Ollama models: {e}")
             return None
 
-    def chat(self, message: str, conversation_history: List[Dict] = None) -> str:
+    def _build_payload(self, message: str, conversation_history: List[Dict] = None,
+                       facts: Dict[str, str] = None) -> dict:
+        """Build the /api/chat request body: system prompt, known facts, recent history, then the new message"""
+        messages = [SYSTEM_MESSAGE]
+        # Facts go after the fixed prompt so the cacheable prefix stays unchanged
+        facts_entry = facts_message(facts)
+        if facts_entry:
+            messages.append(facts_entry)
+        
+        # Add history, as much of the most recent as fits the token budget
+        messages.extend(
+            {"role": "user" if msg.get("is_user") else "assistant", "content": msg.get("content", "")}
+            for msg in fit_to_budget(conversation_history)
+        )
+        
+        # Add current message
+        messages.append({"role": "user", "content": message})
+        
+        return {
+            "model": self.model,
+            "messages": messages,
+            "stream": False,
+            "options": {
+                "temperature": 0.7,
+                "top_p": 0.9,
+                # "num_predict": 256 # Limit output length for speed
+            }
+        }
+    
+    @staticmethod
+    def _extract_reply(result: dict) -> str:
+        """Pull the reply text out of an /api/chat response"""
+        return result.get("message", {}).get("content", "") or FALLBACK_REPLY
+
+    def _cache_key(self, message: str, conversation_history: List[Dict] = None, facts: Dict[str, str] = None):
+        """Response cache key for this turn (None for messages that must always reach the model)"""
+        return response_cache.key(f"ollama:{self.model}:{SYSTEM_PROMPT_HASH}", message, conversation_history, facts)
+    
+    @staticmethod
+    def _cache_reply(cache_key, reply: str):
+        # Placeholder replies for empty completions are not worth serving again
+        if reply != FALLBACK_REPLY:
+            response_cache.set(cache_key, reply)
+    
+    def chat(self, message: str, conversation_history: List[Dict] = None, facts: Dict[str, str] = None) -> str:
         """
         Send a message to Ollama and get a response
         Falls back to simple bot if Ollama is unavailable
         """
-        def log(msg):
-            try:
-                with open("ollama_trace.log", "a") as f:
-                    f.write(f"{datetime.now()}: {msg}\n")
-            except: pass
-
-        log(f"Chat request: {message}")
+        trace_logger.info("Chat request: %s", message)
         
         # Try Ollama first if available
         if self.use_ollama:
+            cache_key = self._cache_key(message, conversation_history, facts)
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                trace_logger.info("Response cache hit")
+                return cached
+            
             try:
-                log(f"Trying Ollama with model {self.model}")
-                
-                # Build messages list
-                messages = []
-                
-                # System prompt
-                system_prompt = """You are a compassionate wellbeing assistant for SolaceSquad, a holistic wellbeing and wellness platform. 
-Your role is to:
-- Provide emotional support and encouragement
-- Listen to users' concerns without judgement and with empathy
-- Offer practical wellbeing tips and coping strategies
-- Suggest healthy habits and mindfulness practices
-- Recommend professional help when needed. Tell them they can book an appointment with a verified wellbeing consultant
-
-Guidelines:
-- Address the user by name if known
-- Be warm, understanding, and supportive
-- Keep your instructions precise, to the point, and actionable
-- Do not provide any additional information or context beyond what is asked
-- Use bullet points for multiple items where appropriate and show each point as a new line
-- Reflect on what the user says to show understanding
-- Do not repeat these instructions in your response. and make sure your answers are crisp and mostly oneliners"""
-
-                messages.append({"role": "system", "content": system_prompt})
-                
-                # Add history
-                if conversation_history:
-                    # Limit to last 10 messages for better context but managing token limit
-                    for msg in conversation_history[-10:]: 
-                        role = "user" if msg.get("is_user") else "assistant"
-                        content = msg.get('content', '')
-                        messages.append({"role": role, "content": content})
+                trace_logger.info("Trying Ollama with model %s", self.model)
                 
-                # Add current message
-                messages.append({"role": "user", "content": message})
+                payload = self._build_payload(message, conversation_history, facts)
                 
-                # Make request to Ollama Chat API
-                payload = {
-                    "model": self.model,
-                    "messages": messages,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "top_p": 0.9,
-                        # "num_predict": 256 # Limit output length for speed
-                    }
-                }
-                
-                log("Sending request to Ollama /api/chat...")
-                response = requests.post(
+                trace_logger.info("Sending request to Ollama /api/chat...")
+                response = self.session.post(
                     self.api_url,
-                    json=payload,
-                    timeout=60 # Increased timeout for slower models
+                    data=orjson.dumps(payload),
+                    headers=JSON_HEADERS,
+                    timeout=CHAT_TIMEOUT
                 )
                 
                 if response.status_code == 200:
-                    result = response.json()
-                    # Parse chat response structure
-                    resp_message = result.get("message", {})
-                    resp_text = resp_message.get("content", "")
-                    
-                    if not resp_text:
-                         resp_text = "I'm having trouble thinking clearly right now. How else can I help?"
-
-                    log(f"Ollama success: {len(resp_text)} chars")
+                    resp_text = self._extract_reply(orjson.loads(response.content))
+                    trace_logger.info("Ollama success: %s chars", len(resp_text))
+                    self._cache_reply(cache_key, resp_text)
                     return resp_text
                 else:
-                    log(f"Ollama failed: {response.status_code} - {response.text}")
+                    trace_logger.info("Ollama failed: %s - %s", response.status_code, response.text)
                     # Fall back to simple bot
                     self.use_ollama = False
                     return simple_bot.get_response(message, conversation_history)
                     
             except requests.exceptions.ConnectionError:
-                log("ConnectionError")
+                trace_logger.info("ConnectionError")
                 # Fall back to simple bot
                 self.use_ollama = False
                 return simple_bot.get_response(message, conversation_history)
             except requests.exceptions.Timeout:
-                log("Timeout")
+                trace_logger.info("Timeout")
                 # Timeout, fallback to simple bot
                 return simple_bot.get_response(message, conversation_history)
             except Exception as e:
-                log(f"Exception: {str(e)}")
+                trace_logger.info("Exception: %s", str(e))
                 print(f"Ollama chat error: {str(e)}")
                 return simple_bot.get_response(message, conversation_history)
         else:
-            log("Using SimpleBot (Ollama unavailable)")
+            trace_logger.info("Using SimpleBot (Ollama unavailable)")
             # Use simple bot
             return simple_bot.get_response(message, conversation_history)
     
+    async def achat(self, message: str, conversation_history: List[Dict] = None,
+                    facts: Dict[str, str] = None) -> str:
+        """
+        Async version of chat() for async handlers
+        Goes through the batcher on the shared AsyncClient instead of blocking a thread per request
+        """
+        if not self.use_ollama:
+            return simple_bot.get_response(message, conversation_history)
+        
+        cache_key = self._cache_key(message, conversation_history, facts)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        try:
+            response = await self.batcher.submit(
+                self._build_payload(message, conversation_history, facts)
+            )
+            if response.status_code == 200:
+                reply = self._extract_reply(orjson.loads(response.content))
+                self._cache_reply(cache_key, reply)
+                return reply
+            
+            # Fall back to simple bot
+            self.use_ollama = False
+            return simple_bot.get_response(message, conversation_history)
+        except httpx.ConnectError:
+            self.use_ollama = False
+            return simple_bot.get_response(message, conversation_history)
+        except httpx.TimeoutException:
+            return simple_bot.get_response(message, conversation_history)
+        except Exception as e:
+            print(f"Ollama chat error: {str(e)}")
+            return simple_bot.get_response(message, conversation_history)
+    
+    async def achat_stream(self, message: str, conversation_history: List[Dict] = None,
+                           facts: Dict[str, str] = None) -> AsyncIterator[str]:
+        """
+        Stream the reply as Ollama generates it, yielding text deltas
+        Streams bypass the batcher (they hold the connection until generation ends)
+        Falls back to simple bot if Ollama is unavailable before anything was sent
+        """
+        parts = []
+        if self.use_ollama:
+            cache_key = self._cache_key(message, conversation_history, facts)
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+            
+            payload = self._build_payload(message, conversation_history, facts)
+            payload["stream"] = True
+            try:
+                async with self.async_client.stream(
+                    "POST", self.api_url, content=orjson.dumps(payload), headers=JSON_HEADERS
+                ) as response:
+                    if response.status_code == 200:
+                        # One JSON object per line, each carrying the next piece of the message
+                        async for line in response.aiter_lines():
+                            if not line:
+                                continue
+                            delta = orjson.loads(line).get("message", {}).get("content", "")
+                            if delta:
+                                parts.append(delta)
+                                yield delta
+                    else:
+                        self.use_ollama = False
+            except httpx.ConnectError:
+                self.use_ollama = False
+            except Exception as e:
+                print(f"Ollama stream error: {str(e)}")
+            if parts:
+                self._cache_reply(cache_key, "".join(parts))
+                return
+        yield simple_bot.get_response(message, conversation_history)
+    
+    async def aextract_facts(self, message: str) -> Dict[str, str]:
+        """Ask the model for durable facts in a user message (post-turn memory hook)"""
+        if not self.use_ollama:
+            return {}
+        try:
+            response = await self.batcher.submit({
+                "model": self.model,
+                "messages": [
+                    {"role": "system", "content": FACT_EXTRACTION_PROMPT},
+                    {"role": "user", "content": message}
+                ],
+                "stream": False,
+                "format": "json",
+                "options": {"temperature": 0}
+            })
+            if response.status_code == 200:
+                return parse_facts(orjson.loads(response.content).get("message", {}).get("content", ""))
+        except Exception as e:
+            print(f"Ollama fact extraction error: {str(e)}")
+        return {}
+    
     def is_available(self) -> bool:
-        """Check if Ollama service is available"""
-        return bool(self._get_best_model())
+        """Check if Ollama service is available (as detected at startup or the last refresh_model())"""
+        return bool(self.model)
 
-# Global instance
-ollama_chat = OllamaChat()
+# Shared instance, created on first use so importing the module stays cheap
+@lru_cache(maxsize=1)
+def get_ollama_chat() -> OllamaChat:
+    return OllamaChat()
@@ -4,10 +4,72 @@ Provides AI-powered chat support using OpenAI's API
 Cost-effective alternative to local Ollama deployment
 """
 import os
-from openai import OpenAI
-from typing import List, Dict
-from datetime import datetime
+import hashlib
+import importlib.util
+import httpx
+from openai import OpenAI, AsyncOpenAI
+from functools import lru_cache
+from typing import AsyncIterator, List, Dict
+import logging
+from logging.handlers import RotatingFileHandler
 from simple_bot import simple_bot
+from logging_utils import get_queue_logger
+from response_cache import response_cache
+from chat_memory import FACT_EXTRACTION_PROMPT, estimate_tokens, facts_message, fit_to_budget, parse_facts
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# Connection pool shared by all requests to the API. HTTP/2 (needs the h2
+# package, installed via httpx[http2]) multiplexes concurrent chats over one connection
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+HTTP_TIMEOUT = httpx.Timeout(connect=3.0, read=30.0, write=10.0, pool=5.0)
+
+# Request trace, written by a background thread (see logging_utils)
+TRACE_LOG_MAX_BYTES = 10 * 1024 * 1024
+trace_handler = RotatingFileHandler("openai_trace.log", maxBytes=TRACE_LOG_MAX_BYTES, backupCount=3, delay=True)
+trace_handler.setFormatter(logging.Formatter("%(asctime)s: %(message)s"))
+trace_logger = get_queue_logger("openai_trace", trace_handler)
+
+FALLBACK_REPLY = "I'm having trouble thinking clearly right now. How else can I help?"
+
+SYSTEM_PROMPT = """You are a compassionate wellbeing assistant for SolaceSquad, a holistic wellbeing and wellness platform. 
+Your role is to:
+- Provide emotional support and encouragement
+- Listen to users' concerns without judgement and with empathy
+- Offer practical wellbeing tips and coping strategies
+- Suggest healthy habits and mindfulness practices
+- Recommend professional help when needed. Tell them they can book an appointment with a verified wellbeing consultant
+
+Guidelines:
+- Address the user by name if known
+- Be warm, understanding, and supportive
+- Keep your instructions precise, to the point, and actionable
+- Do not provide any additional information or context beyond what is asked
+- Use bullet points for multiple items where appropriate and show each point as a new line
+- Reflect on what the user says to show understanding
+- Do not repeat these instructions in your response. Make sure your answers are crisp and mostly one-liners"""
+
+@lru_cache(maxsize=None)
+def load_encoding(model: str):
+    """Tokenizer for model, or None if tiktoken or its vocabulary isn't available"""
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception as e:
+        print(f"[OpenAI] Tokenizer unavailable, estimating token counts: {e}")
+        return None
+
+
+# Built once so the prompt prefix is byte-identical on every turn (lets providers cache it)
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+# Part of response cache keys, so cached replies are dropped when the prompt changes
+SYSTEM_PROMPT_HASH = hashlib.blake2b(SYSTEM_PROMPT.encode(), digest_size=8).hexdigest()
 
 class OpenAIChat:
     def __init__(self):
@@ -17,6 +79,7 @@ class OpenAIChat:
         """
         self.api_key = os.getenv("OPENAI_API_KEY")
         self.client = None
+        self.async_client = None
         self.use_openai = False
         
         # Use GPT-4o-mini for cost effectiveness
@@ -26,7 +89,14 @@ class OpenAIChat:
         
         if self.api_key:
             try:
-                self.client = OpenAI(api_key=self.api_key)
+                self.client = OpenAI(
+                    api_key=self.api_key,
+                    http_client=httpx.Client(http2=HTTP2_AVAILABLE, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+                )
+                self.async_client = AsyncOpenAI(
+                    api_key=self.api_key,
+                    http_client=httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+                )
                 self.use_openai = True
                 print(f"[OpenAI] Connected using model: {self.model}")
             except Exception as e:
@@ -36,60 +106,61 @@ class OpenAIChat:
             print("[OpenAI] API key not found. Set OPENAI_API_KEY environment variable.")
             print("[OpenAI] Using fallback bot.")
     
-    def chat(self, message: str, conversation_history: List[Dict] = None) -> str:
+    def _count_tokens(self, text: str) -> int:
+        encoding = load_encoding(self.model)
+        return len(encoding.encode(text)) if encoding else estimate_tokens(text)
+    
+    def _build_messages(self, message: str, conversation_history: List[Dict] = None,
+                        facts: Dict[str, str] = None) -> List[Dict]:
+        """System prompt, known facts, recent history, then the new message"""
+        messages = [SYSTEM_MESSAGE]
+        # Facts go after the fixed prompt so the cacheable prefix stays unchanged
+        facts_entry = facts_message(facts)
+        if facts_entry:
+            messages.append(facts_entry)
+        
+        # Add history, as much of the most recent as fits the token budget (cost efficiency)
+        messages.extend(
+            {"role": "user" if msg.get("is_user") else "assistant", "content": msg.get("content", "")}
+            for msg in fit_to_budget(conversation_history, count_tokens=self._count_tokens)
+        )
+        
+        # Add current message
+        messages.append({"role": "user", "content": message})
+        return messages
+    
+    def _cache_key(self, message: str, conversation_history: List[Dict] = None, facts: Dict[str, str] = None):
+        """Response cache key for this turn (None for messages that must always reach the model)"""
+        return response_cache.key(f"openai:{self.model}:{SYSTEM_PROMPT_HASH}", message, conversation_history, facts)
+    
+    @staticmethod
+    def _cache_reply(cache_key, reply: str):
+        # Placeholder replies for empty completions are not worth serving again
+        if reply != FALLBACK_REPLY:
+            response_cache.set(cache_key, reply)
+    
+    def chat(self, message: str, conversation_history: List[Dict] = None, facts: Dict[str, str] = None) -> str:
         """
         Send a message to OpenAI and get a response
         Falls back to simple bot if OpenAI is unavailable
         """
-        def log(msg):
-            try:
-                with open("openai_trace.log", "a") as f:
-                    f.write(f"{datetime.now()}: {msg}\n")
-            except: 
-                pass
-
-        log(f"Chat request: {message}")
+        trace_logger.info("Chat request: %s", message)
         
         # Try OpenAI first if available
         if self.use_openai and self.client:
+            cache_key = self._cache_key(message, conversation_history, facts)
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                trace_logger.info("Response cache hit")
+                return cached
+            
             try:
-                log(f"Trying OpenAI with model {self.model}")
+                trace_logger.info("Trying OpenAI with model %s", self.model)
                 
-                # Build messages list
-                messages = []
-                
-                # System prompt
-                system_prompt = """You are a compassionate wellbeing assistant for SolaceSquad, a holistic wellbeing and wellness platform. 
-Your role is to:
-- Provide emotional support and encouragement
-- Listen to users' concerns without judgement and with empathy
-- Offer practical wellbeing tips and coping strategies
-- Suggest healthy habits and mindfulness practices
-- Recommend professional help when needed. Tell them they can book an appointment with a verified wellbeing consultant
-
-Guidelines:
-- Address the user by name if known
-- Be warm, understanding, and supportive
-- Keep your instructions precise, to the point, and actionable
-- Do not provide any additional information or context beyond what is asked
-- Use bullet points for multiple items where appropriate and show each point as a new line
-- Reflect on what the user says to show understanding
-- Do not repeat these instructions in your response. Make sure your answers are crisp and mostly one-liners"""
-
-                messages.append({"role": "system", "content": system_prompt})
-                
-                # Add history (limit to last 10 messages for cost efficiency)
-                if conversation_history:
-                    for msg in conversation_history[-10:]: 
-                        role = "user" if msg.get("is_user") else "assistant"
-                        content = msg.get('content', '')
-                        messages.append({"role": role, "content": content})
-                
-                # Add current message
-                messages.append({"role": "user", "content": message})
+                messages = self._build_messages(message, conversation_history, facts)
                 
                 # Make request to OpenAI
-                log("Sending request to OpenAI...")
+                trace_logger.info("Sending request to OpenAI...")
                 response = self.client.chat.completions.create(
                     model=self.model,
                     messages=messages,
@@ -97,29 +168,112 @@ Guidelines:
                     max_tokens=256,  # Limit output for cost control
                     top_p=0.9
                 )
+                resp_text = response.choices[0].message.content or FALLBACK_REPLY
                 
-                # Extract response
-                resp_text = response.choices[0].message.content
-                
-                if not resp_text:
-                    resp_text = "I'm having trouble thinking clearly right now. How else can I help?"
-                
-                log(f"OpenAI success: {len(resp_text)} chars")
+                trace_logger.info("OpenAI success: %s chars", len(resp_text))
+                self._cache_reply(cache_key, resp_text)
                 return resp_text
                     
             except Exception as e:
-                log(f"OpenAI error: {str(e)}")
+                trace_logger.info("OpenAI error: %s", str(e))
                 print(f"OpenAI chat error: {str(e)}")
                 # Fall back to simple bot
                 return simple_bot.get_response(message, conversation_history)
         else:
-            log("Using SimpleBot (OpenAI unavailable)")
+            trace_logger.info("Using SimpleBot (OpenAI unavailable)")
             # Use simple bot
             return simple_bot.get_response(message, conversation_history)
     
+    async def achat(self, message: str, conversation_history: List[Dict] = None,
+                    facts: Dict[str, str] = None) -> str:
+        """
+        Async version of chat() for async handlers
+        Awaits OpenAI on AsyncOpenAI instead of blocking a thread per request
+        """
+        if not (self.use_openai and self.async_client):
+            return simple_bot.get_response(message, conversation_history)
+        
+        cache_key = self._cache_key(message, conversation_history, facts)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=self._build_messages(message, conversation_history, facts),
+                temperature=0.7,
+                max_tokens=256,  # Limit output for cost control
+                top_p=0.9
+            )
+            reply = response.choices[0].message.content or FALLBACK_REPLY
+            self._cache_reply(cache_key, reply)
+            return reply
+        except Exception as e:
+            print(f"OpenAI chat error: {str(e)}")
+            # Fall back to simple bot
+            return simple_bot.get_response(message, conversation_history)
+    
+    async def achat_stream(self, message: str, conversation_history: List[Dict] = None,
+                           facts: Dict[str, str] = None) -> AsyncIterator[str]:
+        """
+        Stream the reply as OpenAI generates it, yielding text deltas
+        Falls back to simple bot if OpenAI is unavailable before anything was sent
+        """
+        parts = []
+        if self.use_openai and self.async_client:
+            cache_key = self._cache_key(message, conversation_history, facts)
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+            
+            try:
+                stream = await self.async_client.chat.completions.create(
+                    model=self.model,
+                    messages=self._build_messages(message, conversation_history, facts),
+                    temperature=0.7,
+                    max_tokens=256,  # Limit output for cost control
+                    top_p=0.9,
+                    stream=True
+                )
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+            except Exception as e:
+                print(f"OpenAI stream error: {str(e)}")
+            if parts:
+                self._cache_reply(cache_key, "".join(parts))
+                return
+        yield simple_bot.get_response(message, conversation_history)
+    
+    async def aextract_facts(self, message: str) -> Dict[str, str]:
+        """Ask the model for durable facts in a user message (post-turn memory hook)"""
+        if not (self.use_openai and self.async_client):
+            return {}
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": FACT_EXTRACTION_PROMPT},
+                    {"role": "user", "content": message}
+                ],
+                response_format={"type": "json_object"},
+                temperature=0,
+                max_tokens=100
+            )
+            return parse_facts(response.choices[0].message.content)
+        except Exception as e:
+            print(f"OpenAI fact extraction error: {str(e)}")
+            return {}
+    
     def is_available(self) -> bool:
         """Check if OpenAI service is available"""
         return self.use_openai
 
-# Global instance
-openai_chat = OpenAIChat()
+# Shared instance, created on first use so importing the module stays cheap
+@lru_cache(maxsize=1)
+def get_openai_chat() -> OpenAIChat:
+    return OpenAIChat()
@@ -7,6 +7,154 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from reportlab.pdfgen import canvas
 from io import BytesIO
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import multiprocessing
+import os
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+# "weasyprint" renders prescriptions from an HTML template through WeasyPrint's
+# C (cairo/pango) pipeline; ReportLab stays the default and the fallback
+PDF_ENGINE = os.getenv("PRESCRIPTION_PDF_ENGINE", "reportlab").lower()
+
+# Only imported when selected: WeasyPrint raises OSError at import time when the
+# system pango/cairo libraries are missing (e.g. on python:3.11-slim)
+weasyprint = None
+if PDF_ENGINE == "weasyprint":
+    try:
+        import weasyprint
+    except ImportError:
+        print("[PDF] weasyprint package not installed. Run: pip install weasyprint")
+    except OSError as e:
+        print(f"[PDF] WeasyPrint system libraries (pango/cairo) missing, using reportlab: {str(e)}")
+WEASYPRINT_AVAILABLE = weasyprint is not None
+
+# Parsed once; Environment caches the compiled template
+_template_env = Environment(
+    loader=FileSystemLoader(os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")),
+    autoescape=select_autoescape(["html"])
+)
+
+
+# Paragraph and table styles are immutable once built, so create them once at import instead of per PDF
+_styles = getSampleStyleSheet()
+
+TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=_styles['Heading1'],
+    fontSize=24,
+    textColor=colors.HexColor('#0284c7'),
+    spaceAfter=6,
+    alignment=TA_CENTER,
+    fontName='Helvetica-Bold'
+)
+
+SUBTITLE_STYLE = ParagraphStyle(
+    'CustomSubtitle',
+    parent=_styles['Normal'],
+    fontSize=10,
+    textColor=colors.HexColor('#666666'),
+    spaceAfter=20,
+    alignment=TA_CENTER
+)
+
+HEADING_STYLE = ParagraphStyle(
+    'CustomHeading',
+    parent=_styles['Heading2'],
+    fontSize=12,
+    textColor=colors.HexColor('#1f2937'),
+    spaceAfter=8,
+    spaceBefore=12,
+    fontName='Helvetica-Bold'
+)
+
+NORMAL_STYLE = ParagraphStyle(
+    'CustomNormal',
+    parent=_styles['Normal'],
+    fontSize=10,
+    textColor=colors.HexColor('#374151'),
+    spaceAfter=6
+)
+
+FOOTER_STYLE = ParagraphStyle(
+    'Footer',
+    parent=_styles['Normal'],
+    fontSize=8,
+    textColor=colors.HexColor('#6b7280'),
+    spaceAfter=4
+)
+
+LINE_TABLE_STYLE = TableStyle([
+    ('LINEABOVE', (0, 0), (-1, 0), 2, colors.HexColor('#0284c7')),
+])
+
+HEADER_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#374151')),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+])
+
+MED_HEADER_ROW = ['#', 'Medication', 'Dosage', 'Frequency', 'Duration']
+
+MED_TABLE_STYLE = TableStyle([
+    # Header row
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0284c7')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('TOPPADDING', (0, 0), (-1, 0), 12),
+    
+    # Data rows
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor('#374151')),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('TOPPADDING', (0, 1), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+    
+    # Grid
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
+    
+    # Alternating row colors
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9fafb')]),
+])
+
+# Layout and compression hold the GIL, so PDFs are rendered in worker processes.
+# Workers are spawned rather than forked because the app process already runs threads.
+# Each uvicorn worker has its own pool, so keep it small on memory-limited instances
+PDF_POOL_WORKERS = int(os.getenv("PDF_POOL_WORKERS", "2"))
+_pdf_pool = None
+
+
+def get_pdf_pool():
+    """Process pool for PDF rendering, started on first use"""
+    global _pdf_pool
+    if _pdf_pool is None:
+        _pdf_pool = ProcessPoolExecutor(
+            max_workers=PDF_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pdf_pool
+
+
+def discard_pdf_pool(pool):
+    """Drop a broken pool so the next call to get_pdf_pool() starts a fresh one"""
+    global _pdf_pool
+    if _pdf_pool is pool:
+        _pdf_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pdf_pool():
+    """Stop the PDF worker processes (on application shutdown)"""
+    global _pdf_pool
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(wait=True, cancel_futures=True)
+        _pdf_pool = None
 
 
 def generate_prescription_pdf(prescription_data):
@@ -17,7 +165,7 @@ def generate_prescription_pdf(prescription_data):
         prescription_data: Dictionary containing prescription details
         
     Returns:
-        BytesIO object containing the PDF
+        PDF bytes
     """
     buffer = BytesIO()
     
@@ -34,58 +182,15 @@ def generate_prescription_pdf(prescription_data):
     # Container for the 'Flowable' objects
     elements = []
     
-    # Define styles
-    styles = getSampleStyleSheet()
-    
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#0284c7'),
-        spaceAfter=6,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold'
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=colors.HexColor('#666666'),
-        spaceAfter=20,
-        alignment=TA_CENTER
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=12,
-        textColor=colors.HexColor('#1f2937'),
-        spaceAfter=8,
-        spaceBefore=12,
-        fontName='Helvetica-Bold'
-    )
-    
-    normal_style = ParagraphStyle(
-        'CustomNormal',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=colors.HexColor('#374151'),
-        spaceAfter=6
-    )
-    
     # Add letterhead
-    elements.append(Paragraph("SolaceSquad", title_style))
-    elements.append(Paragraph("Your Wellbeing Partner", subtitle_style))
+    elements.append(Paragraph("SolaceSquad", TITLE_STYLE))
+    elements.append(Paragraph("Your Wellbeing Partner", SUBTITLE_STYLE))
     
     # Add horizontal line
     elements.append(Spacer(1, 0.1*inch))
     line_data = [['', '']]
     line_table = Table(line_data, colWidths=[6.5*inch])
-    line_table.setStyle(TableStyle([
-        ('LINEABOVE', (0, 0), (-1, 0), 2, colors.HexColor('#0284c7')),
-    ]))
+    line_table.setStyle(LINE_TABLE_STYLE)
     elements.append(line_table)
     elements.append(Spacer(1, 0.2*inch))
     
@@ -95,42 +200,38 @@ def generate_prescription_pdf(prescription_data):
          'Date:', prescription_data['created_at'].strftime('%B %d, %Y')]
     ]
     header_table = Table(header_data, colWidths=[1.5*inch, 1.75*inch, 0.75*inch, 1.5*inch])
-    header_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#374151')),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-    ]))
+    header_table.setStyle(HEADER_TABLE_STYLE)
+
     elements.append(header_table)
     elements.append(Spacer(1, 0.3*inch))
     
     # Consultant information
-    elements.append(Paragraph("Prescribed By", heading_style))
+    elements.append(Paragraph("Prescribed By", HEADING_STYLE))
     consultant_info = f"""
     <b>Dr. {prescription_data['consultant_name']}</b><br/>
     {prescription_data['consultant_specialization']}<br/>
     """
-    elements.append(Paragraph(consultant_info, normal_style))
+    elements.append(Paragraph(consultant_info, NORMAL_STYLE))
     elements.append(Spacer(1, 0.2*inch))
     
     # Patient information
-    elements.append(Paragraph("Patient Name", heading_style))
-    elements.append(Paragraph(prescription_data['patient_name'], normal_style))
+    elements.append(Paragraph("Patient Name", HEADING_STYLE))
+    elements.append(Paragraph(prescription_data['patient_name'], NORMAL_STYLE))
     elements.append(Spacer(1, 0.2*inch))
     
     # Diagnosis
     if prescription_data.get('diagnosis'):
-        elements.append(Paragraph("Diagnosis", heading_style))
-        elements.append(Paragraph(prescription_data['diagnosis'], normal_style))
+        elements.append(Paragraph("Diagnosis", HEADING_STYLE))
+        elements.append(Paragraph(prescription_data['diagnosis'], NORMAL_STYLE))
         elements.append(Spacer(1, 0.2*inch))
     
     # Medications
-    elements.append(Paragraph("Medications", heading_style))
+    elements.append(Paragraph("Medications", HEADING_STYLE))
     elements.append(Spacer(1, 0.1*inch))
     
-    # Create medications table
-    med_data = [['#', 'Medication', 'Dosage', 'Frequency', 'Duration']]
+    # Create medications table, collecting each medication's instructions in the same pass
+    med_data = [MED_HEADER_ROW]
+    instruction_paragraphs = []
     
     for idx, item in enumerate(prescription_data['items'], 1):
         med_data.append([
@@ -140,73 +241,78 @@ def generate_prescription_pdf(prescription_data):
             item.get('frequency', '-'),
             item.get('duration', '-')
         ])
+        if item.get('instructions'):
+            instr_text = f"<b>{idx}. {item['medication_name']}:</b> {item['instructions']}"
+            instruction_paragraphs.append(Paragraph(instr_text, NORMAL_STYLE))
     
     med_table = Table(med_data, colWidths=[0.4*inch, 2.2*inch, 1.2*inch, 1.2*inch, 1.0*inch])
-    med_table.setStyle(TableStyle([
-        # Header row
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0284c7')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('TOPPADDING', (0, 0), (-1, 0), 12),
-        
-        # Data rows
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor('#374151')),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 1), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
-        
-        # Grid
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
-        
-        # Alternating row colors
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9fafb')]),
-    ]))
+    med_table.setStyle(MED_TABLE_STYLE)
+
     elements.append(med_table)
     elements.append(Spacer(1, 0.2*inch))
     
     # Instructions for each medication
-    for idx, item in enumerate(prescription_data['items'], 1):
-        if item.get('instructions'):
-            instr_text = f"<b>{idx}. {item['medication_name']}:</b> {item['instructions']}"
-            elements.append(Paragraph(instr_text, normal_style))
-    
-    if any(item.get('instructions') for item in prescription_data['items']):
+    if instruction_paragraphs:
+        elements.extend(instruction_paragraphs)
         elements.append(Spacer(1, 0.2*inch))
     
     # Additional notes
     if prescription_data.get('notes'):
-        elements.append(Paragraph("Additional Notes", heading_style))
-        elements.append(Paragraph(prescription_data['notes'], normal_style))
+        elements.append(Paragraph("Additional Notes", HEADING_STYLE))
+        elements.append(Paragraph(prescription_data['notes'], NORMAL_STYLE))
         elements.append(Spacer(1, 0.3*inch))
     
     # Footer
     elements.append(Spacer(1, 0.3*inch))
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.HexColor('#6b7280'),
-        spaceAfter=4
-    )
-    
     elements.append(Paragraph(
         "<b>Note:</b> This is a digital prescription. Please follow the prescribed medication as directed.",
-        footer_style
+        FOOTER_STYLE
     ))
     elements.append(Paragraph(
         "For any queries, please contact your healthcare provider.",
-        footer_style
+        FOOTER_STYLE
     ))
     
     # Build PDF
     doc.build(elements)
     
-    # Get the value of the BytesIO buffer
-    pdf = buffer.getvalue()
-    buffer.close()
+    # getvalue() hands over the buffer's own bytes (no copy) since nothing else holds it
+    return buffer.getvalue()
+
+
+def generate_prescription_pdf_html(prescription_data):
+    """
+    Generate the prescription PDF from the HTML template with WeasyPrint
     
-    return pdf
+    Args:
+        prescription_data: Dictionary containing prescription details
+        
+    Returns:
+        PDF bytes
+    """
+    html = _template_env.get_template("pdf/prescription.html").render(
+        rx=prescription_data,
+        header_row=MED_HEADER_ROW
+    )
+    return weasyprint.HTML(string=html).write_pdf()
+
+
+def render_prescription_pdf(prescription_data):
+    """Generate the prescription PDF with the configured engine"""
+    if PDF_ENGINE == "weasyprint" and WEASYPRINT_AVAILABLE:
+        return generate_prescription_pdf_html(prescription_data)
+    return generate_prescription_pdf(prescription_data)
+
+
+async def generate_prescription_pdf_async(prescription_data):
+    """Render a prescription PDF in the process pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    pool = get_pdf_pool()
+    try:
+        return await loop.run_in_executor(pool, render_prescription_pdf, prescription_data)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for running out of memory), which breaks the whole
+        # pool; start a fresh one and retry once
+        print("[PDF] Process pool broken, restarting it")
+        discard_pdf_pool(pool)
+        return await loop.run_in_executor(get_pdf_pool(), render_prescription_pdf, prescription_data)
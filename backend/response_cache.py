@@ -0,0 +1,89 @@
+"""
+Response Cache
+Exact-match cache of AI chat replies for repeated prompts ("I feel anxious",
+"how do I sleep better"), so common questions skip the model round-trip
+Per-process LRU with a short TTL
+"""
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+RESPONSE_CACHE_MAX_ENTRIES = 1024
+# Kept short so answers never go stale for long
+RESPONSE_CACHE_TTL = 15 * 60
+
+# Messages that may signal a crisis always get a fresh answer from the model
+RISK_PATTERN = re.compile(
+    r"suicid|self[\s-]?harm|kill(ing)? (my ?self|me)|end(ing)? (my life|it all)|hurt(ing)? my ?self"
+    r"|cut(ting)? my ?self|(don'?t|do not) want to (live|be alive)|overdos"
+    r"|\b(want to|wanna|wish i (was|were)|going to|gonna) die\b|\b(wish i (was|were)|better off) dead\b"
+    r"|no reason to live|(too many|overdose on) pills"
+)
+PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so trivial variations share an entry"""
+    return " ".join(PUNCTUATION.sub("", message.lower()).split())
+
+
+class ResponseCache:
+    """LRU cache of chat replies keyed on the message and the assistant's last reply"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl: int = RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, reply), least recently used first
+        self._lock = threading.Lock()
+
+    def key(self, namespace: str, message: str, conversation_history: List[Dict] = None,
+            facts: Dict[str, str] = None) -> Optional[str]:
+        """
+        Cache key for a chat turn, or None if the turn must not be cached
+
+        Args:
+            namespace: Identifies the backend, model and system prompt (e.g. its hash)
+            message: The user's new message
+            conversation_history: Recent messages; only the last assistant reply is part of the key
+            facts: Long-term facts injected into the prompt (replies may quote them)
+        """
+        if RISK_PATTERN.search(message.lower()):
+            return None
+        last_reply = next(
+            (msg.get("content", "") for msg in reversed(conversation_history or []) if not msg.get("is_user")),
+            ""
+        )
+        parts = [namespace, normalize_message(message), last_reply]
+        if facts:
+            parts.extend(f"{name}={value}" for name, value in sorted(facts.items()))
+        return hashlib.blake2b("|".join(parts).encode(), digest_size=16).hexdigest()
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, reply = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return reply
+
+    def set(self, key: Optional[str], reply: str):
+        if key is None or not reply:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, reply)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+
+# Global instance
+response_cache = ResponseCache()
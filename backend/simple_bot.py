@@ -4,7 +4,35 @@ Works without external dependencies as a fallback when Ollama is unavailable
 """
 import random
 import re
+import time
 from datetime import datetime
+from functools import lru_cache
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Category patterns are all of the form \b(keyword|keyword ...)\b
+KEYWORD_GROUP_RE = re.compile(r'^\\b\((.*)\)\\b$')
+# A single word, as delimited by \b
+WORD_RE = re.compile(r'\w+')
+
+# "I feel ..." / "I am ..." statements, for reflecting the feeling back. Scanned in the
+# same pass as the multi-word category keywords
+REFLECTION_PATTERN = r'\bi (?:feel|am) (?P<feeling>[a-z]+)'
+REFLECTION_PREFIXES = ('i feel ', 'i am ')
+
+# Distinct (message, last bot message) classifications kept; short replies ("ok", "yes") repeat a lot
+CLASSIFY_CACHE_SIZE = 2048
+
+GREETING_INTRO = "I'm your AI wellbeing assistant. I can guide you through grounding exercises, breathing techniques, or just listen to how you're feeling."
+GREETING_MORNING = f"Good morning! {GREETING_INTRO}"
+GREETING_AFTERNOON = f"Good afternoon! {GREETING_INTRO}"
+GREETING_EVENING = f"Good evening! {GREETING_INTRO}"
+# Only the hour matters, so the greeting is re-checked at most once a minute
+GREETING_TTL = 60
 
 class SimpleWellbeingBot:
     def __init__(self):
@@ -35,6 +63,28 @@ class SimpleWellbeingBot:
             }
         }
         
+        # Every flow step in order, side by side with the step that follows it (None at
+        # the end of a flow). self.flows stays the source for starting a flow
+        self._all_steps = []
+        self._step_next = []
+        for flow_data in self.flows.values():
+            steps = flow_data['steps']
+            self._all_steps.extend(steps)
+            self._step_next.extend(steps[1:])
+            self._step_next.append(None)
+        
+        # Position in those arrays, looked up by the bot's last message
+        self._step_by_text = {}
+        self._step_by_prefix = {}
+        self._step_by_suffix = {}
+        for position, step in enumerate(self._all_steps):
+            clean_step = step.strip()
+            # setdefault: the first flow/step wins, as in a front-to-back scan
+            self._step_by_text.setdefault(clean_step, position)
+            if len(clean_step) > 20:
+                self._step_by_prefix.setdefault(clean_step[:20], position)
+                self._step_by_suffix.setdefault(clean_step[-20:], position)
+        
         self.responses = {
             'greeting': [
                 "Hello! I'm here to support your wellbeing journey. How are you feeling right now?",
@@ -111,8 +161,11 @@ class SimpleWellbeingBot:
                 "I hear you. It's safe to share more if you'd like.",
             ]
         }
+        # Tuples: indexed directly when picking a reply
+        self.responses = {category: tuple(options) for category, options in self.responses.items()}
         
-        self.patterns = {
+        # Compiled once; get_response runs them against every message
+        patterns = {
             'greeting': r'\b(hi|hello|hey|good morning|good evening|greetings)\b',
             'stress': r'\b(stress|stressed|overwhelm|pressure|too much|tense)\b',
             'anxiety': r'\b(anxious|anxiety|worried|worry|nervous|panic|scared|fear)\b',
@@ -133,81 +186,147 @@ class SimpleWellbeingBot:
             'trigger_yes': r'\b(yes|sure|okay|yeah|yep|please|ok|do it)\b',
             'trigger_no': r'\b(no|nope|nah|pas|later|stop|don\'t|quit)\b'
         }
+        # Messages are lowercased before matching, so the patterns can stay case-sensitive
+        self.patterns = {name: re.compile(pattern) for name, pattern in patterns.items()}
+        
+        # Categories in priority order. Single-word keywords are looked up per word of the
+        # message; multi-word ones ("too much", "professional help") share one regex with
+        # the reflection pattern. Each alternative sits in a lookahead so a phrase never
+        # hides an overlapping one
+        self.categories = [name for name in patterns if not name.startswith('trigger_')]
+        self.category_rank = {name: rank for rank, name in enumerate(self.categories)}
+        self.keyword_rank = {}  # keyword -> rank of the highest-priority category using it
+        phrases = {}  # category -> its multi-word keywords
+        for rank, name in enumerate(self.categories):
+            for keyword in KEYWORD_GROUP_RE.match(patterns[name]).group(1).split('|'):
+                if WORD_RE.fullmatch(keyword):
+                    self.keyword_rank.setdefault(keyword, rank)
+                else:
+                    phrases.setdefault(name, []).append(keyword)
+        self.phrase_re = re.compile(
+            "(?=(?P<reflection>%s)|%s)" % (
+                REFLECTION_PATTERN,
+                "|".join(f"(?P<{name}>\\b({'|'.join(map(re.escape, keywords))})\\b)" for name, keywords in phrases.items())
+            )
+        )
+        self.keyword_automaton = self._build_keyword_automaton(
+            [keyword for keywords in phrases.values() for keyword in keywords] + list(REFLECTION_PREFIXES)
+        )
+
+        # Only the classification is cached; the random choice of reply stays per call
+        self._classify = lru_cache(maxsize=CLASSIFY_CACHE_SIZE)(self._classify_message)
+        
+        self._greeting = None
+        self._greeting_expires_at = 0.0
     
     def get_response(self, message: str, conversation_history: list = None) -> str:
         """Generate a response based on the user's message and history"""
-        message_lower = message.lower()
+        last_bot_msg = self._get_last_bot_message(conversation_history)
+        feeling, category, reply = self._classify(message.lower(), last_bot_msg)
+
+        # Reflection ("I feel ...") only happens some of the time, otherwise fall through
+        if feeling and random.random() < 0.3:
+            return f"I understand that you feel {feeling}. Can you tell me more about what's making you feel {feeling}?"
+        if category:
+            return self._get_varied_response(category, last_bot_msg)
+        return reply
+
+    def cache_info(self):
+        """Hit/miss statistics of the message classification cache"""
+        return self._classify.cache_info()
+
+    def _classify_message(self, message_lower, last_bot_msg):
+        """
+        Deterministic part of get_response, cached per (message, last bot message)
         
+        Returns (feeling, category, reply): a feeling to maybe reflect back, then either
+        a response category to vary or a fixed reply
+        """
         # 1. Check if we are in an active flow
-        active_flow_response = self._check_active_flow(conversation_history)
+        active_flow_response = self._check_active_flow(last_bot_msg)
         if active_flow_response:
             # If the user says "no" or "stop" to continuing a flow, break out
-            if re.search(self.patterns['trigger_no'], message_lower):
-                return "That's completely okay. We can stop. How else can I support you right now?"
-            return active_flow_response
+            if self.patterns['trigger_no'].search(message_lower):
+                return None, None, "That's completely okay. We can stop. How else can I support you right now?"
+            return None, None, active_flow_response
 
         # 2. Check for flow triggers in current message
-        if re.search(self.patterns['trigger_grounding'], message_lower):
-            return self.flows['54321']['steps'][0]
-        
-        if re.search(self.patterns['trigger_breathing'], message_lower):
-            return self.flows['breathing']['steps'][0]
-
-        # 3. Check for reflection patterns (I feel...)
-        reflection_match = re.search(r'\bi (feel|am) ([a-z]+)', message_lower)
-        if reflection_match and len(message_lower.split()) < 10:  # Only for short simpler sentences
-            feeling = reflection_match.group(2)
-            # Avoid repeating valid keywords if they act as triggers (handled below), but catch others
-            if feeling not in ['grounding', 'breathing', 'ready']:
-                # random chance to reflect or fall through to specific category
-                if random.random() < 0.3:
-                    return f"I understand that you feel {feeling}. Can you tell me more about what's making you feel {feeling}?"
-
-        # 4. Check for general patterns
-        for category, pattern in self.patterns.items():
-            if category.startswith('trigger_'): continue # Skip flow triggers checked above
-            if re.search(pattern, message_lower, re.IGNORECASE):
-                return self._get_varied_response(category, conversation_history)
+        if self.patterns['trigger_grounding'].search(message_lower):
+            return None, None, self.flows['54321']['steps'][0]
+        
+        if self.patterns['trigger_breathing'].search(message_lower):
+            return None, None, self.flows['breathing']['steps'][0]
+
+        # 3. Check for reflection patterns (I feel...) and 4. general patterns, in one scan
+        feeling, category = self._scan_message(message_lower)
+        if len(message_lower.split(None, 9)) >= 10:  # Only reflect short simpler sentences (under 10 words)
+            feeling = None
+        # Avoid repeating valid keywords if they act as triggers (handled below), but catch others
+        if feeling in ['grounding', 'breathing', 'ready']:
+            feeling = None
+
+        if category:
+            return feeling, category, None
         
         # 5. Contextual "Yes" handling (if user says "yes" without a clear trigger)
-        if conversation_history and len(conversation_history) > 0 and re.search(self.patterns['trigger_yes'], message_lower):
-            last_bot_msg = self._get_last_bot_message(conversation_history)
-            if last_bot_msg:
-                if 'grounding' in last_bot_msg.lower() or '5-4-3-2-1' in last_bot_msg:
-                    return self.flows['54321']['steps'][0]
-                if 'breath' in last_bot_msg.lower():
-                    return self.flows['breathing']['steps'][0]
+        if last_bot_msg and self.patterns['trigger_yes'].search(message_lower):
+            if 'grounding' in last_bot_msg.lower() or '5-4-3-2-1' in last_bot_msg:
+                return feeling, None, self.flows['54321']['steps'][0]
+            if 'breath' in last_bot_msg.lower():
+                return feeling, None, self.flows['breathing']['steps'][0]
         
         # 6. Default response
-        return self._get_varied_response('default', conversation_history)
+        return feeling, 'default', None
 
-    def _check_active_flow(self, history):
-        """Check if the conversation is currently inside a flow"""
-        last_bot_msg = self._get_last_bot_message(history)
+    @staticmethod
+    def _build_keyword_automaton(words):
+        """Aho-Corasick automaton over the given words, or None without pyahocorasick"""
+        if not AHOCORASICK_AVAILABLE:
+            return None
+        automaton = ahocorasick.Automaton()
+        for word in words:
+            automaton.add_word(word, word)
+        automaton.make_automaton()
+        return automaton
+    
+    def _scan_message(self, message_lower):
+        """
+        The first "I feel ..." feeling and the highest-priority category in the message
         
+        Returns (feeling, category), either of which may be None
+        """
+        ranks = [rank for rank in map(self.keyword_rank.get, WORD_RE.findall(message_lower)) if rank is not None]
+        best = min(ranks, default=None)
+        
+        # Most messages contain no phrase or "i feel"/"i am" at all; the automaton rules
+        # that out in one linear pass before the regex runs
+        feeling = None
+        if self.keyword_automaton is None or next(self.keyword_automaton.iter(message_lower), None) is not None:
+            for match in self.phrase_re.finditer(message_lower):
+                if match.lastgroup == 'reflection':
+                    if feeling is None:
+                        feeling = match.group('feeling')
+                else:
+                    rank = self.category_rank[match.lastgroup]
+                    if best is None or rank < best:
+                        best = rank
+        return feeling, None if best is None else self.categories[best]
+    
+    def _check_active_flow(self, last_bot_msg):
+        """Check if the conversation is currently inside a flow, given the bot's last message"""
         if not last_bot_msg:
             return None
 
-        # Check which flow and step we are in using fuzzy matching
-        for flow_name, flow_data in self.flows.items():
-            for i, step in enumerate(flow_data['steps']):
-                # Simple fuzzy match: check if the first 15 chars match or last 15 chars match
-                # This handles minor differences or truncations
-                clean_step = step.strip()
-                clean_last = last_bot_msg.strip()
-                
-                # Check for exact match or partial match
-                match = (clean_step == clean_last) or \
-                        (len(clean_step) > 20 and clean_step[:20] == clean_last[:20]) or \
-                        (len(clean_step) > 20 and clean_step[-20:] == clean_last[-20:])
-                
-                if match:
-                    # valid match, return the NEXT step
-                    if i + 1 < len(flow_data['steps']):
-                        return flow_data['steps'][i + 1]
-                    else:
-                        # Flow finished
-                        return None
+        # Check which flow and step we are in using fuzzy matching: the exact step,
+        # or its first or last 20 characters (handles minor differences or truncations)
+        clean_last = last_bot_msg.strip()
+        for step_by, key in ((self._step_by_text, clean_last),
+                             (self._step_by_prefix, clean_last[:20]),
+                             (self._step_by_suffix, clean_last[-20:])):
+            position = step_by.get(key)
+            if position is not None:
+                # The step after the matched one, or None once the flow is finished
+                return self._step_next[position]
         return None
 
     def _get_last_bot_message(self, history):
@@ -220,32 +339,35 @@ class SimpleWellbeingBot:
                 return msg.get('content')
         return None
 
-    def _get_varied_response(self, category, history):
+    def _get_varied_response(self, category, last_bot_msg):
         """Get a response that isn't the same as the last one"""
         options = self.responses.get(category, self.responses['default'])
+        if len(options) == 1:
+            return options[0]
         
-        # Try to avoid the exact same response as last time
-        last_bot_msg = self._get_last_bot_message(history)
-        
-        # Filter out the last message from options if possible
-        valid_options = [opt for opt in options if opt != last_bot_msg]
-        
-        if not valid_options: # If we exhausted options (shouldn't happen with default), reset
-            valid_options = options
-            
-        return random.choice(valid_options)
+        # Try to avoid the exact same response as last time by moving on to the next option
+        i = random.randrange(len(options))
+        if options[i] == last_bot_msg:
+            i = (i + 1) % len(options)
+        return options[i]
     
     def get_greeting(self) -> str:
         """Get a greeting message"""
+        now = time.monotonic()
+        if now < self._greeting_expires_at:
+            return self._greeting
+        
         hour = datetime.now().hour
         if hour < 12:
-            greeting = "Good morning"
+            greeting = GREETING_MORNING
         elif hour < 18:
-            greeting = "Good afternoon"
+            greeting = GREETING_AFTERNOON
         else:
-            greeting = "Good evening"
+            greeting = GREETING_EVENING
         
-        return f"{greeting}! I'm your AI wellbeing assistant. I can guide you through grounding exercises, breathing techniques, or just listen to how you're feeling."
+        self._greeting = greeting
+        self._greeting_expires_at = now + GREETING_TTL
+        return greeting
 
 # Global instance
 simple_bot = SimpleWellbeingBot()
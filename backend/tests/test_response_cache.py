@@ -0,0 +1,38 @@
+import pytest
+
+from response_cache import RISK_PATTERN, response_cache
+
+RISKY_MESSAGES = [
+    "I want to die",
+    "i wanna die",
+    "I wish I was dead",
+    "honestly I'm going to die alone and nobody cares",
+    "everyone would be better off dead without me",
+    "there's no reason to live anymore",
+    "I keep thinking of ending my life",
+    "I took too many pills",
+    "I've been thinking about suicide",
+    "I want to kill myself",
+    "I don't want to live",
+    "I started self-harm again",
+]
+
+SAFE_MESSAGES = [
+    "I feel anxious",
+    "how do I sleep better",
+    "I died laughing at that movie",
+    "my phone battery is about to die",
+    "can you remind me to take my pills",
+]
+
+
+@pytest.mark.parametrize("message", RISKY_MESSAGES)
+def test_risky_messages_are_never_cached(message):
+    assert RISK_PATTERN.search(message.lower())
+    assert response_cache.key("test", message) is None
+
+
+@pytest.mark.parametrize("message", SAFE_MESSAGES)
+def test_safe_messages_are_cached(message):
+    assert not RISK_PATTERN.search(message.lower())
+    assert response_cache.key("test", message) is not None
@@ -4,18 +4,61 @@ Provides AI-powered chat support using Google's Gemini models
 Uses GCP credits - FREE tier available!
 """
 import os
-from typing import List, Dict
-from datetime import datetime
+import importlib.util
+from itertools import islice
+import logging
+from logging.handlers import RotatingFileHandler
+from typing import Iterator, List, Dict
 from simple_bot import simple_bot
+from logging_utils import get_queue_logger
 
-try:
-    import vertexai
-    from vertexai.generative_models import GenerativeModel, ChatSession
-    VERTEX_AI_AVAILABLE = True
-except ImportError:
-    VERTEX_AI_AVAILABLE = False
+# The SDK (gRPC, protobuf, auth) is slow to import, so it is only imported once a
+# GCP project is configured; finding the package is enough to report availability
+VERTEX_AI_AVAILABLE = importlib.util.find_spec("vertexai") is not None
+if not VERTEX_AI_AVAILABLE:
     print("[Vertex AI] Package not installed. Run: pip install google-cloud-aiplatform")
 
+# Request trace, written by a background thread (see logging_utils)
+TRACE_LOG_MAX_BYTES = 10 * 1024 * 1024
+trace_handler = RotatingFileHandler("vertex_ai_trace.log", maxBytes=TRACE_LOG_MAX_BYTES, backupCount=3, delay=True)
+trace_handler.setFormatter(logging.Formatter("%(asctime)s: %(message)s"))
+trace_logger = get_queue_logger("vertex_ai_trace", trace_handler)
+
+# Last 10 messages of context for cost control
+MAX_HISTORY_MESSAGES = 10
+
+SYSTEM_PROMPT = """You are a compassionate wellbeing assistant for SolaceSquad, a holistic wellbeing and wellness platform. 
+Your role is to:
+- Provide emotional support and encouragement
+- Listen to users' concerns without judgement and with empathy
+- Offer practical wellbeing tips and coping strategies
+- Suggest healthy habits and mindfulness practices
+- Recommend professional help when needed. Tell them they can book an appointment with a verified wellbeing consultant
+
+Guidelines:
+- Address the user by name if known
+- Be warm, understanding, and supportive
+- Keep your instructions precise, to the point, and actionable
+- Do not provide any additional information or context beyond what is asked
+- Use bullet points for multiple items where appropriate and show each point as a new line
+- Reflect on what the user says to show understanding
+- Do not repeat these instructions in your response. Make sure your answers are crisp and mostly one-liners"""
+
+# Sent when the model returns an empty reply
+EMPTY_REPLY = "I'm having trouble thinking clearly right now. How else can I help?"
+
+# Generation parameters for cost control
+GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 0.9,
+    "max_output_tokens": 256,  # Limit output for cost control
+}
+
+def recent_messages(conversation_history: List[Dict] = None):
+    """Iterate over the last MAX_HISTORY_MESSAGES messages without copying the list"""
+    history = conversation_history or []
+    return islice(history, max(0, len(history) - MAX_HISTORY_MESSAGES), None)
+
 class VertexAIChat:
     def __init__(self):
         """
@@ -40,9 +83,12 @@ class VertexAIChat:
             
         if self.project_id:
             try:
+                import vertexai
+                from vertexai.generative_models import GenerativeModel
+                
                 # Initialize Vertex AI
                 vertexai.init(project=self.project_id, location=self.location)
-                self.model = GenerativeModel(self.model_name)
+                self.model = GenerativeModel(self.model_name, system_instruction=SYSTEM_PROMPT)
                 self.use_vertex_ai = True
                 print(f"[Vertex AI] Connected using model: {self.model_name}")
                 print(f"[Vertex AI] Project: {self.project_id}, Location: {self.location}")
@@ -58,89 +104,68 @@ class VertexAIChat:
         Send a message to Vertex AI and get a response
         Falls back to simple bot if Vertex AI is unavailable
         """
-        def log(msg):
-            try:
-                with open("vertex_ai_trace.log", "a") as f:
-                    f.write(f"{datetime.now()}: {msg}\n")
-            except: 
-                pass
-
-        log(f"Chat request: {message}")
+        return "".join(self.chat_stream(message, conversation_history))
+    
+    def chat_stream(self, message: str, conversation_history: List[Dict] = None) -> Iterator[str]:
+        """
+        Stream the reply as Vertex AI generates it, yielding text chunks
+        Falls back to simple bot if Vertex AI is unavailable before anything was sent
+        """
+        trace_logger.info("Chat request: %s", message)
         
         # Try Vertex AI first if available
         if self.use_vertex_ai and self.model:
+            chars = 0
             try:
-                log(f"Trying Vertex AI with model {self.model_name}")
-                
-                # Build conversation context
-                context_messages = []
-                
-                # System prompt
-                system_prompt = """You are a compassionate wellbeing assistant for SolaceSquad, a holistic wellbeing and wellness platform. 
-Your role is to:
-- Provide emotional support and encouragement
-- Listen to users' concerns without judgement and with empathy
-- Offer practical wellbeing tips and coping strategies
-- Suggest healthy habits and mindfulness practices
-- Recommend professional help when needed. Tell them they can book an appointment with a verified wellbeing consultant
-
-Guidelines:
-- Address the user by name if known
-- Be warm, understanding, and supportive
-- Keep your instructions precise, to the point, and actionable
-- Do not provide any additional information or context beyond what is asked
-- Use bullet points for multiple items where appropriate and show each point as a new line
-- Reflect on what the user says to show understanding
-- Do not repeat these instructions in your response. Make sure your answers are crisp and mostly one-liners"""
-
-                # Add conversation history
-                if conversation_history:
-                    for msg in conversation_history[-10:]:  # Last 10 messages for cost control
-                        role = "user" if msg.get("is_user") else "model"
-                        content = msg.get('content', '')
-                        context_messages.append(f"{role}: {content}")
-                
-                # Combine system prompt with history
-                full_context = system_prompt
-                if context_messages:
-                    full_context += "\n\nConversation history:\n" + "\n".join(context_messages)
-                
-                # Add current message
-                full_prompt = f"{full_context}\n\nuser: {message}\nmodel:"
+                trace_logger.info("Trying Vertex AI with model %s", self.model_name)
                 
                 # Make request to Vertex AI
-                log("Sending request to Vertex AI...")
-                
-                # Configure generation parameters for cost control
-                generation_config = {
-                    "temperature": 0.7,
-                    "top_p": 0.9,
-                    "max_output_tokens": 256,  # Limit output for cost control
-                }
-                
-                response = self.model.generate_content(
-                    full_prompt,
-                    generation_config=generation_config
+                trace_logger.info("Sending request to Vertex AI...")
+                responses = self.model.generate_content(
+                    self._build_prompt(message, conversation_history),
+                    generation_config=GENERATION_CONFIG,
+                    stream=True
                 )
                 
-                # Extract response text
-                resp_text = response.text
-                
-                if not resp_text:
-                    resp_text = "I'm having trouble thinking clearly right now. How else can I help?"
-                
-                log(f"Vertex AI success: {len(resp_text)} chars")
-                return resp_text
+                for chunk in responses:
+                    text = chunk.text
+                    if text:
+                        chars += len(text)
+                        yield text
                     
             except Exception as e:
-                log(f"Vertex AI error: {str(e)}")
+                trace_logger.info("Vertex AI error: %s", str(e))
                 print(f"Vertex AI chat error: {str(e)}")
-                # Fall back to simple bot
-                return simple_bot.get_response(message, conversation_history)
+                # Fall back to simple bot, unless part of the reply was already sent
+                if not chars:
+                    yield simple_bot.get_response(message, conversation_history)
+                return
+            
+            if not chars:
+                yield EMPTY_REPLY
+                chars = len(EMPTY_REPLY)
+            trace_logger.info("Vertex AI success: %s chars", chars)
         else:
-            log("Using SimpleBot (Vertex AI unavailable)")
+            trace_logger.info("Using SimpleBot (Vertex AI unavailable)")
             # Use simple bot
-            return simple_bot.get_response(message, conversation_history)
+            yield simple_bot.get_response(message, conversation_history)
+    
+    def _build_prompt(self, message: str, conversation_history: List[Dict] = None) -> str:
+        """
+        Build the prompt as one list of lines (the model carries the system prompt):
+        conversation history, then the current message
+        """
+        prompt_lines = []
+        if conversation_history:
+            prompt_lines.append("Conversation history:")
+            prompt_lines.extend(
+                f"{'user' if msg.get('is_user') else 'model'}: {msg.get('content', '')}"
+                for msg in recent_messages(conversation_history)
+            )
+            prompt_lines.append("")
+        prompt_lines.append(f"user: {message}")
+        prompt_lines.append("model:")
+        return "\n".join(prompt_lines)
     
     def is_available(self) -> bool:
         """Check if Vertex AI service is available"""